@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+# SNMPv2c agent stand-in on localhost answering GET, GETNEXT and GETBULK from a snmpwalk dump
+# prints the port it listens on, a datagram "stats" returns the packet and byte counters as JSON
+#
+# python3 benchmarks/agent.py <dump> [port]
+
+import os
+import sys
+import json
+import socket
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import check_isam
+from check_isam import SnmpDump,ber_decode_message,ber_encode_message
+
+# easysnmp types of the dump parser -> BER tag, the inverse of the table of the async transport
+TYPE_TAGS = dict((snmp_type,tag) for tag,snmp_type in check_isam.BER_TYPES.items())
+
+
+def encode_record(record):
+#   (oid, tag, value) for the BER codec from a record of the dump
+
+    oid,value,snmp_type = record
+    tag = TYPE_TAGS.get(snmp_type,check_isam.BER_OCTET_STRING)
+    if tag == check_isam.BER_OCTET_STRING:
+        try: value = value.encode("latin-1")
+        except UnicodeEncodeError: value = value.encode("utf-8")
+    elif tag == check_isam.BER_IPADDRESS: value = bytes(int(octet) for octet in value.split("."))
+    elif tag != check_isam.BER_OBJECT_IDENTIFIER: value = int(value)
+    return oid,tag,value
+
+
+class Agent(object):
+#   the dump is read with the parser of check_isam.py --replay
+
+    def __init__(self,dump):
+        self.dump = dump
+        self.packets = 0
+        self.received = 0
+        self.sent = 0
+
+    def get(self,oid):
+        record = self.dump.get(oid)
+        if record is None: return oid,check_isam.BER_NOSUCHINSTANCE,None
+        return encode_record(record)
+
+    def next(self,oid):
+        record = self.dump.next(oid)
+        if record is None: return oid,check_isam.BER_ENDOFMIBVIEW,None
+        return encode_record(record)
+
+    def answer(self,data):
+        community,pdu_type,request_id,non_repeaters,max_repetitions,varbinds = ber_decode_message(data)
+        if pdu_type == check_isam.BER_GET:
+            result = [self.get(oid) for oid,tag,value in varbinds]
+        elif pdu_type == check_isam.BER_GETNEXT:
+            result = [self.next(oid) for oid,tag,value in varbinds]
+        elif pdu_type == check_isam.BER_GETBULK:
+            result = [self.next(oid) for oid,tag,value in varbinds[:non_repeaters]]
+            current = [oid for oid,tag,value in varbinds[non_repeaters:]]
+            for i in range(max_repetitions):
+                row = [self.next(oid) for oid in current]
+                result += row
+                current = [oid for oid,tag,value in row]
+                if all(tag == check_isam.BER_ENDOFMIBVIEW for oid,tag,value in row): break
+        else:
+            return None
+        return ber_encode_message(community,check_isam.BER_RESPONSE,request_id,result)
+
+    def serve(self,sock):
+        while True:
+            data,address = sock.recvfrom(65535)
+            if data == b"stats":
+                sock.sendto(json.dumps({"packets":self.packets,"received":self.received,"sent":self.sent}).encode(),address)
+                continue
+            try:
+                reply = self.answer(data)
+            except Exception:
+                continue
+            if reply is None: continue
+            self.packets += 1
+            self.received += len(data)
+            self.sent += len(reply)
+            sock.sendto(reply,address)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2,3):
+        print("usage: agent.py <dump> [port]")
+        sys.exit(2)
+    sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1",int(sys.argv[2]) if len(sys.argv) == 3 else 0))
+    print("%i" % sock.getsockname()[1])
+    sys.stdout.flush()
+    try:
+        Agent(SnmpDump(sys.argv[1])).serve(sock)
+    except KeyboardInterrupt:
+        pass
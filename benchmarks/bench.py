@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+# benchmark of every check against synthetic ISAM walks served by a local SNMP agent
+#
+# python3 benchmarks/bench.py [--datasets fx8,fx16,large_pon] [--repeat 5] [--startup-budget 30] [--output run.json]
+# python3 benchmarks/bench.py --compare base.json run.json [--tolerance 10]
+#
+# per data set and check: wall time (median of --repeat runs), PDUs, UDP packets and bytes, peak python memory
+# start-up: time of "check_isam.py --version" (imports and option parser, no SNMP) above a bare interpreter
+
+import os
+import sys
+import json
+import time
+import tempfile
+import platform
+import tracemalloc
+import subprocess
+from optparse import OptionParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.dirname(HERE))
+sys.path.insert(0,HERE)
+
+import datasets
+
+# metrics of a check which are compared between runs, a higher value is worse for all of them
+METRICS = ["wall_ms","pdus","packets","bytes","peak_kib"]
+
+# metrics which are deterministic, any increase is a regression
+EXACT_METRICS = ["pdus","packets","bytes"]
+
+
+def agent_stats(port):
+#   packet and byte counters of the agent
+
+    import socket
+    sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+    sock.settimeout(5)
+    try:
+        sock.sendto(b"stats",("127.0.0.1",port))
+        return json.loads(sock.recv(4096).decode())
+    finally:
+        sock.close()
+
+
+def start_agent(dump):
+#   agent in its own process, so its work is not part of the measured time and memory
+
+    agent = subprocess.Popen([sys.executable,os.path.join(HERE,"agent.py"),dump],stdout=subprocess.PIPE,cwd=HERE)
+    return agent,int(agent.stdout.readline())
+
+
+def measure_startup(repeat):
+#   median time of a plugin process which only builds the parser, and of a bare interpreter, in ms
+
+    def median(command):
+        runs = []
+        for i in range(max(repeat,5)):
+            start = time.perf_counter()
+            subprocess.run(command,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+            runs.append((time.perf_counter() - start)*1000)
+        return sorted(runs)[len(runs)//2]
+
+    interpreter = median([sys.executable,"-c","pass"])
+    plugin = median([sys.executable,os.path.join(os.path.dirname(HERE),"check_isam.py"),"--version"])
+    return {"interpreter_ms":interpreter,"plugin_ms":plugin,"startup_ms":plugin - interpreter}
+
+
+def run_check(check_isam,port,name,params,transport,trace=False):
+#   one run of one check over a new session, returns the metrics of the run
+
+    before = agent_stats(port)
+    if trace: tracemalloc.start()
+    start = time.perf_counter()
+    session = check_isam.IsamSession("127.0.0.1:%i" % port,"public",timeout=2,retries=1,transport=transport)
+    result = check_isam.run_isam_check(session,name,params)
+    session.close()
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace: tracemalloc.stop()
+    after = agent_stats(port)
+    return {"wall_ms":wall*1000,"pdus":session.pdus,"packets":after["packets"]-before["packets"],
+            "bytes":after["received"]-before["received"]+after["sent"]-before["sent"],"peak_kib":peak/1024.0,
+            "state":result.state,"summary":result.summary}
+
+
+def run_benchmark(names,repeat,transport):
+#   all checks against all data sets
+
+    import check_isam
+    results = {}
+    for name in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            agent,port = start_agent(datasets.write(name,os.path.join(tmp,"%s.walk" % name)))
+            try:
+                params = {"slot_mapping":datasets.slot_mapping(name),"verbose":None,"warning":80,"critical":85,"groupId":1,"state_dir":None,
+                          "ont_warning":-25,"ont_critical":-28,"ont_pon_critical":4,"ont_top":10,"ont_rx_oid":check_isam.OID_ONT_RX,"ont_tx_oid":check_isam.OID_ONT_TX,
+                          "history_dir":None,"pon_window":0,"pon_statistic":"p95"}
+                results[name] = {}
+                for check,description in check_isam.ISAM_CHECKS:
+                    runs = [run_check(check_isam,port,check,params,transport) for i in range(repeat)]
+                    metrics = run_check(check_isam,port,check,params,transport,trace=True)
+                    metrics["wall_ms"] = sorted(run["wall_ms"] for run in runs)[len(runs)//2]
+                    metrics["wall_min_ms"] = min(run["wall_ms"] for run in runs)
+                    results[name][check] = metrics
+                    print("%-10s %-20s %9.2f ms %6i PDUs %9i bytes %9.1f KiB  %s" % (name,check,metrics["wall_ms"],metrics["pdus"],metrics["bytes"],metrics["peak_kib"],metrics["summary"]))
+                    sys.stdout.flush()
+            finally:
+                agent.terminate()
+                agent.wait()
+    return results
+
+
+def compare(base,new,tolerance):
+#   prints the change of every metric, returns the number of regressions
+#   timings and memory regress beyond the tolerance in percent, PDUs and bytes with any increase
+
+    regressions = 0
+    if "startup" in base and "startup" in new:
+        old,cur = base["startup"]["startup_ms"],new["startup"]["startup_ms"]
+        delta = (cur-old)*100.0/old if old else 0.0
+        if delta > tolerance: regressions += 1
+        print("%-31s startup_ms %s%+.1f%% (%.1f ms)" % ("start-up","!" if delta > tolerance else "",delta,cur))
+    for name in sorted(new["results"]):
+        for check in sorted(new["results"][name]):
+            old = base["results"].get(name,{}).get(check)
+            if not old: continue
+            cur = new["results"][name][check]
+            fields = []
+            for metric in METRICS:
+                delta = (cur[metric]-old[metric])*100.0/old[metric] if old[metric] else 0.0
+                worse = cur[metric] > old[metric] if metric in EXACT_METRICS else delta > tolerance
+                if worse: regressions += 1
+                fields.append("%s %s%+.1f%%" % (metric,"!" if worse else "",delta))
+            print("%-10s %-20s %s" % (name,check,"  ".join(fields)))
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage="\n %prog [--datasets fx8,fx16,large_pon] [--repeat 5] [--output run.json]\n %prog --compare base.json run.json [--tolerance 10]")
+    parser.add_option("--datasets",dest="datasets",default="fx8,fx16,large_pon",help="comma separated data sets (%s)" % ", ".join(sorted(datasets.DATASETS)))
+    parser.add_option("--repeat",dest="repeat",type="int",default=5,help="timed runs per check (default 5)")
+    parser.add_option("--transport",dest="transport",type="choice",choices=["easysnmp","async"],default="easysnmp",help="SNMP transport of the checks (default easysnmp)")
+    parser.add_option("--output",dest="output",help="write results as JSON")
+    parser.add_option("--startup-budget",dest="startup_budget",type="float",default=30,help="allowed start-up time above a bare interpreter in ms (default 30)")
+    parser.add_option("--compare",action="store_true",dest="compare",help="compare two result files")
+    parser.add_option("--tolerance",dest="tolerance",type="float",default=10,help="allowed increase of time and memory in percent (default 10)")
+    (options,args) = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2: parser.error("--compare needs two result files")
+        regressions = compare(json.load(open(args[0])),json.load(open(args[1])),options.tolerance)
+        print("%i regressions" % regressions)
+        sys.exit(1 if regressions else 0)
+
+    names = options.datasets.split(",")
+    for name in names:
+        if name not in datasets.DATASETS: parser.error("unknown data set '%s'" % name)
+    startup = measure_startup(options.repeat)
+    print("start-up   %.2f ms above the interpreter (%.2f ms), budget %.0f ms" % (startup["startup_ms"],startup["interpreter_ms"],options.startup_budget))
+    run = {"time":time.time(),"python":platform.python_version(),"repeat":options.repeat,"transport":options.transport,"startup":startup,
+           "results":run_benchmark(names,options.repeat,options.transport)}
+    if options.output:
+        with open(options.output,"w") as f: json.dump(run,f,indent=1,sort_keys=True)
+    if startup["startup_ms"] > options.startup_budget:
+        print("start-up exceeds the budget of %.0f ms" % options.startup_budget)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
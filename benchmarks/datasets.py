@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+# synthetic ISAM walks in "snmpwalk -On" format for the benchmark agent
+#
+# fx8        one FX-8 shelf, 8 LTs with 16 PONs
+# fx16       one FX-16 shelf, 16 LTs with 16 PONs
+# large_pon  four FX-16 shelves with 1024 PONs and 32 ONTs per PON in the ONT optics table
+
+import os
+import sys
+
+ASAM = ".1.3.6.1.4.1.637.61.1"
+
+# ONT optics table (rx/tx optical level in 1/500 dBm per ONT), read by the ont_optics check
+OID_ONT_RX = ASAM + ".35.10.14.1.2"
+OID_ONT_TX = ASAM + ".35.10.14.1.4"
+
+# name -> (shelves, LTs per shelf, ONTs per PON)
+DATASETS = {"fx8":(1,8,0),"fx16":(1,16,0),"large_pon":(4,16,32)}
+
+
+def slot_index(shelf,position):
+#   board table index: rack 1, shelf and position in the shelf
+
+    return (0x10 | shelf) << 8 | position
+
+
+def slot_mapping(name):
+#   slot index -> name like the plugin's slot mapping, for all boards of a data set
+
+    shelves,lts,onts = DATASETS[name]
+    mapping = {}
+    for shelf in range(1,shelves+1):
+        if shelf == 1:
+            mapping[slot_index(shelf,0)] = "acu:1/1"
+            mapping[slot_index(shelf,1)] = "nt-a"
+            mapping[slot_index(shelf,2)] = "nt-b"
+        for lt in range(1,lts+1): mapping[slot_index(shelf,lt+2)] = "lt:1/%i/%i" % (shelf,lt)
+    return mapping
+
+
+def ont_rx(ifindex,ont):
+#   rx level of an ONT between -18 and -24 dBm, every 61st ONT at -29 dBm
+
+    if ((ifindex >> 8) + ont) % 61 == 0: return -14500
+    return -9000 - ((ifindex >> 8)*7 + ont*37) % 3000
+
+
+def lines(name):
+#   lines of the walk column by column, values are spread so thresholds are crossed
+
+    shelves,lts,onts = DATASETS[name]
+    boards = sorted(slot_mapping(name).items())
+    types = {"acu:1/1":"NGFC-F","nt-a":"FANT-F","nt-b":"FANT-F"}
+
+    yield "%s = Timeticks: (8640000) 1 day, 0:00:00.00" % ".1.3.6.1.2.1.1.3.0"
+    yield "%s = Timeticks: (1000) 0:00:10.00" % ".1.3.6.1.2.1.47.1.4.1.0"
+    for column in (3,7,8):
+        for index,board in boards:
+            if column == 3: yield '%s.23.3.1.3.%i = STRING: "%s"' % (ASAM,index,types.get(board,"FWLT-C" if index % 2 else "FGLT-B"))
+            else: yield "%s.23.3.1.%i.%i = INTEGER: 1" % (ASAM,column,index)
+    for column,value in ((4,2),(5,10),(9,2),(10,10)):
+        yield "%s.24.2.%i.0 = INTEGER: %i" % (ASAM,column,value)
+    for column,value in ((5,1),(8,1),(11,1)):
+        yield "%s.23.5.2.1.%i.1 = INTEGER: %i" % (ASAM,column,value)
+    yield "%s.23.5.3.1.3.%i = INTEGER: 1" % (ASAM,slot_index(1,1))
+    yield "%s.23.5.3.1.3.%i = INTEGER: 2" % (ASAM,slot_index(1,2))
+    for column,value in ((2,40),(3,75),(5,85)):
+        for index,board in boards:
+            for sensor in (1,2): yield "%s.23.10.1.%i.%i.%i = INTEGER: %i" % (ASAM,column,index,sensor,value + (index+sensor) % 7 if column == 2 else value)
+    for column,value in ((5,53000),(6,1500),(10,0),(12,0),(14,0),(15,0),(16,0),(17,0)):
+        for ps in (1,2): yield "%s.23.19.1.%i.%i = INTEGER: %i" % (ASAM,column,ps,value)
+
+    pons = [(1 << 28 | shelf << 24 | lt << 16 | port << 8) for shelf in range(1,shelves+1) for lt in range(1,lts+1) for port in range(1,17)]
+    for column in (6,7):
+        for i,ifindex in enumerate(pons):
+            yield "%s.35.21.57.1.%i.%i = Gauge32: %i" % (ASAM,column,ifindex,(i*797 % 9000) if column == 7 else (i*331 % 4000))
+    for column in (OID_ONT_RX,OID_ONT_TX):
+        for ifindex in pons:
+            for ont in range(1,onts+1): yield "%s.%i = INTEGER: %i" % (column,ifindex | ont,ont_rx(ifindex,ont) if column == OID_ONT_RX else 1000 + ont*13)
+
+
+def generate(name):
+#   lines of the walk in oid order, like snmpwalk writes them
+
+    def key(line): return tuple(int(arc) for arc in line.split(" ",1)[0].strip(".").split("."))
+    return sorted(lines(name),key=key)
+
+
+def write(name,path):
+    with open(path,"w") as f:
+        for line in generate(name): f.write(line + "\n")
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in DATASETS:
+        print("usage: %s <%s> <file>" % (os.path.basename(sys.argv[0]),"|".join(sorted(DATASETS))))
+        sys.exit(2)
+    write(sys.argv[1],sys.argv[2])
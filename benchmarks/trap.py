@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+# sends an SNMPv2c trap or inform like an ISAM would, stands in for the device when testing the trap receiver of the daemon
+# every varbind is an oid with an INTEGER value or NULL, e.g. the availability of the board in slot 4355:
+#
+# python3 benchmarks/trap.py <host:port> <community> [--inform] <oid>[=<integer>] ...
+
+import os
+import sys
+import time
+import socket
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import check_isam
+from check_isam import ber_encode_message,ber_decode_message
+
+# snmpTrapOID.0 and a placeholder notification below the ISAM enterprise subtree, the receiver only looks at the other varbinds
+OID_SNMP_TRAP = "1.3.6.1.6.3.1.1.4.1.0"
+OID_TRAP = "1.3.6.1.4.1.637.61.1.23.0.1"
+
+
+def varbinds(arguments):
+#   sysUpTime and snmpTrapOID first like every SNMPv2 notification, then the given oids
+
+    result = [(check_isam.OID_SYS_UPTIME,check_isam.BER_TIMETICKS,int(time.monotonic()*100) % 2**32),
+              (OID_SNMP_TRAP,check_isam.BER_OBJECT_IDENTIFIER,OID_TRAP)]
+    for argument in arguments:
+        oid,value = (argument.split("=",1) + [None])[:2]
+        if value is None: result.append((oid,check_isam.BER_NULL,None))
+        else: result.append((oid,check_isam.BER_INTEGER,int(value)))
+    return result
+
+
+def send(target,community,arguments,inform=False,timeout=2):
+#   returns True when the trap was sent or the inform was acknowledged
+
+    host,port = target.rsplit(":",1)
+    sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    request_id = int(time.time()) % 0x7fffffff
+    try:
+        sock.sendto(ber_encode_message(community.encode(),check_isam.BER_INFORM if inform else check_isam.BER_TRAPV2,request_id,varbinds(arguments)),(host or "127.0.0.1",int(port)))
+        while inform:
+            reply = ber_decode_message(sock.recvfrom(65535)[0])
+            if reply[1] == check_isam.BER_RESPONSE and reply[2] == request_id: return True
+        return True
+    except socket.timeout:
+        return False
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--inform"]
+    if len(arguments) < 2:
+        print("usage: trap.py <host:port> <community> [--inform] <oid>[=<integer>] ...")
+        sys.exit(2)
+    if not send(arguments[0],arguments[1],arguments[2:],"--inform" in sys.argv):
+        print("no response to the inform")
+        sys.exit(1)
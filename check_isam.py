@@ -8,330 +8,1713 @@
 ###
 
 
+import os
 import sys
-from optparse import OptionParser
-from easysnmp import snmp_get,snmp_walk
+import time
+
+# modules needed only by the daemon, fleet, state store or option parsing are imported where they are used,
+# so a single check starts with as few imports as possible
+
+
+# checks in output order with their service description
+ISAM_CHECKS = [("board_availability","ISAM Board Availability"),
+               ("board_oper_status","ISAM Board Operational-Status"),
+               ("auto_backup_status","Configbackup Status"),
+               ("pon_utilization","ISAM PON Utilization"),
+               ("board_temperature","ISAM Board Thermal-Status"),
+               ("nt_redundancy","ISAM NT-Redundancy Status"),
+               ("power_supply","ISAM Power Supply"),
+               ("ont_optics","ISAM ONT Optics")]
+
+# board table columns shared by several checks: actual type, operational status, availability status
+OID_BOARD_TABLE = ["1.3.6.1.4.1.637.61.1.23.3.1.3","1.3.6.1.4.1.637.61.1.23.3.1.7","1.3.6.1.4.1.637.61.1.23.3.1.8"]
+
+# status tables of the checks, built once when the plugin is loaded
+DICT_AVAILABILITY_STATUS = {0:"unknown",1:"available",2:"selftest in progress",3:"failed",4:"powered off",5:"not installed",6:"offline",7:"dependency"}
+DICT_OPERATIONAL_STATUS = {0:'unknown',1:'no-error',2:'type-mismatch',3:'board-missing',4:'board-installation-missing',5:'no-planned-board',6:'waiting-for-sw',7:'init-boot-failed',8:'init-download-failed',9:'init-connection-failed',10:'init-configuration-failed',11:'board-reset-protection',12:'invalid-parameter',13:'temperature-alarm',14:'temperature-shutdown',15:'defense',16:'board-not-licensed',17:'sem-power-fail',18:'sem-ups-fail',19:'board-in-incompatible-slot',20:'download-ongoing',255:'unknown-error'}
+OPERATIONAL_WARNING = {5,6,16,19}
+OPERATIONAL_CRITICAL = {2,3,4,7,8,9,10,11,12,13,14,15,17,18,20,255}
+DICT_PROGRESS = {0:"unknown",1:"ongoing",2:"finished and successfull",3:"finished but failed"}
+DICT_DN_ERROR = {0:"unknown",1:"file not found",2:"access violation",3:"disk full - allocation needed",4:"illegal tftp-operation",5:"unknown transfer-id",6:"file already exists",7:"no such user",8:"corrupted database - incomplete database",9:"system restart",10:"no error",11:"corrupted iss-config",12:"corrupted iss-prot-config"}
+DICT_UP_ERROR = {0:"unknown",1:"file not found",2:"access violation",3:"disk full - allocation needed",4:"illegal tftp-operation",5:"unknown transfer-id",6:"file already exists",7:"no such user",8:"selected database not available",9:"system restart",10:"no error",11:"another SWDB process is ongoing"}
+DICT_ADMIN_STATE = {1:"unlock",2:"lock"}
+DICT_GROUP_ROW_STATE = {1:"active", 2:"not in service", 3:"not ready", 4:"create and go", 5:"create and wait", 6:"destroy"}
+DICT_STANDBY_STATE = {0:"not-supported",1:"providing-service",2:"hot-standby",3:"cold-standby",4:"idle"}
+DICT_LAST_SWITCH_REASON = {1:"no switchover",2:"forced active",3:"board not present",4:"extender chain failure",5:"link failure",6:"watchdog timeout",7:"filesystem corrupt",8:"configuration mismatch",9:"board unplanned",10:"board locked",11:"shelf defense",12:"revertive switchover",13:"lanx failure",14:"lanx hw-failure",15:"lanx sdk failure",16:"dpoe app failure",17:"dpoe unreachable",18:"forced switchover"}
+DICT_EQPT_PS_NAME = {0:"BAT-A",1:"BAT-B"}
+DICT_EQPT_PS_FAULT_VIN = {0:"no-error",1:"input-overvoltage-fault",2:"input-overvoltage-warning",3:"input-undervoltage-warning",4:"input-undervoltage-fault",5:"input-ac-nok-fault",6:"input-ac-nok-warning",7:"unit-off-for-insufficient-input-voltage"}
+DICT_EQPT_PS_FAULT_IIN = {0:"no-error",1:"input-overcurrent-fault",2:"input-overcurrent-warning",3:"input-overpower-warning"}
+DICT_EQPT_PS_FAULT_TEMP = {0:"no-error",1:"overtemperature-fault",2:"overtemperature-warning",3:"undertemperature-warning",4:"undertemperature-fault"}
+DICT_EQPT_PS_FAULT_CML = {0:"no-error",1:"invalid-or-unsupported-command-received",2:"invalid-or-unsupported-data-received",3:"packet-error-check-failed",4:"memory-fault-detected",5:"processor-fault-detected",6:"other-communication-fault",7:"other-memory-or-logic-fault"}
+DICT_EQPT_PS_PRESENT = {0:"yes",1:"no"}
+DICT_EQPT_PS_FAULT_DETECTED = {0:"no",1:"yes"}
+
+# ONT optics table: rx and tx optical level of every ONT in 1/ONT_LEVEL_SCALE dBm, indexed by the ONT ifIndex (PON ifIndex | ONT number)
+# the oids can be overridden with --ont-rx-oid and --ont-tx-oid for releases which place the table elsewhere
+OID_ONT_RX = "1.3.6.1.4.1.637.61.1.35.10.14.1.2"
+OID_ONT_TX = "1.3.6.1.4.1.637.61.1.35.10.14.1.4"
+ONT_LEVEL_SCALE = 500.0
+
+# board table index (rack << 12 | shelf << 8 | position): positions of the acu and the NTs, LT slot numbers are position - 2
+SLOT_ACU = 0
+SLOT_NT = {1:"nt-a",2:"nt-b"}
+SLOT_LT = range(1,63)
+SLOT_VLT = range(63,65)
+
+# checks which name boards by their slot
+SLOT_CHECKS = ["board_availability","board_oper_status","board_temperature"]
+
+# PON utilization history file header: magic, polls in the ring buffer, PONs per poll, polls written so far
+PON_HISTORY_MAGIC = b"ISAMPON1"
+PON_HISTORY_HEADER = "<8sIIQ"
+
+# snmpwalk type names -> easysnmp types, for dumps read by --replay
+DUMP_TYPES = {"INTEGER":"INTEGER","STRING":"OCTETSTR","Hex-STRING":"OCTETSTR","OID":"OBJECTID","IpAddress":"IPADDR",
+              "Counter32":"COUNTER","Gauge32":"GAUGE","Timeticks":"TICKS","Counter64":"COUNTER64"}
+
+# BER tags of SNMPv2c pdus and values, for the async transport
+BER_GET = 0xa0
+BER_GETNEXT = 0xa1
+BER_RESPONSE = 0xa2
+BER_GETBULK = 0xa5
+BER_INFORM = 0xa6
+BER_TRAPV2 = 0xa7
+BER_REPORT = 0xa8
+BER_INTEGER = 0x02
+BER_OCTET_STRING = 0x04
+BER_NULL = 0x05
+BER_OBJECT_IDENTIFIER = 0x06
+BER_SEQUENCE = 0x30
+BER_IPADDRESS = 0x40
+BER_COUNTER32 = 0x41
+BER_GAUGE32 = 0x42
+BER_TIMETICKS = 0x43
+BER_COUNTER64 = 0x46
+BER_NOSUCHOBJECT = 0x80
+BER_NOSUCHINSTANCE = 0x81
+BER_ENDOFMIBVIEW = 0x82
+
+# BER tag -> easysnmp type
+BER_TYPES = {BER_INTEGER:"INTEGER",BER_OCTET_STRING:"OCTETSTR",BER_NULL:"NULL",BER_OBJECT_IDENTIFIER:"OBJECTID",BER_IPADDRESS:"IPADDR",
+             BER_COUNTER32:"COUNTER",BER_GAUGE32:"GAUGE",BER_TIMETICKS:"TICKS",BER_COUNTER64:"COUNTER64",
+             BER_NOSUCHOBJECT:"NOSUCHOBJECT",BER_NOSUCHINSTANCE:"NOSUCHINSTANCE",BER_ENDOFMIBVIEW:"ENDOFMIBVIEW"}
+
+# SNMPv3 user-based security: auth protocol -> (hash, length of the truncated HMAC), privacy protocols
+USM_AUTH_PROTOCOLS = {"MD5":("md5",12),"SHA":("sha1",12),"SHA256":("sha256",24)}
+USM_PRIV_PROTOCOLS = ["AES","DES"]
+# usmStats counters sent in reports, unknown engine id and not in time window are answered by sending the request again
+USM_UNKNOWN_ENGINE_ID = "1.3.6.1.6.3.15.1.1.4.0"
+USM_NOT_IN_TIME_WINDOW = "1.3.6.1.6.3.15.1.1.2.0"
+USM_REPORTS = {"1.3.6.1.6.3.15.1.1.1.0":"unsupported security level",USM_NOT_IN_TIME_WINDOW:"not in time window","1.3.6.1.6.3.15.1.1.3.0":"unknown user name",
+               USM_UNKNOWN_ENGINE_ID:"unknown engine id","1.3.6.1.6.3.15.1.1.5.0":"wrong digest","1.3.6.1.6.3.15.1.1.6.0":"decryption error"}
+
+# board checks which can be answered from the state store in conditional mode
+CONDITIONAL_CHECKS = ["board_availability","board_oper_status"]
+
+# change indicator of conditional mode: sysUpTime and by default entLastChangeTime (ENTITY-MIB)
+OID_SYS_UPTIME = "1.3.6.1.2.1.1.3.0"
+OID_ENT_LAST_CHANGE = "1.3.6.1.2.1.47.1.4.1.0"
+
+# tables re-polled row by row when a trap of the device names one of their rows, with the checks evaluating them
+TRAP_TABLES = [("1.3.6.1.4.1.637.61.1.23.3.1",["board_availability","board_oper_status"]),
+               ("1.3.6.1.4.1.637.61.1.23.5.2.1",["nt_redundancy"]),
+               ("1.3.6.1.4.1.637.61.1.23.5.3.1",["nt_redundancy"]),
+               ("1.3.6.1.4.1.637.61.1.23.10.1",["board_temperature"]),
+               ("1.3.6.1.4.1.637.61.1.23.19.1",["power_supply"])]
+
+# row classes of IsamSession.stream_rows by column names
+TABLE_ROW_TYPES = {}
+
+# metric families of the exporter in output order with their help text, all of them are gauges
+EXPORTER_METRICS = [("isam_check_state","State of the check: 0 ok, 1 warning, 2 critical, 3 unknown"),
+                    ("isam_board_availability_status","Availability status of the board: 1 available, 2 selftest in progress, 3 failed, 4 powered off, 5 not installed, 6 offline, 7 dependency"),
+                    ("isam_board_operational_status","Operational status of the board: 1 no-error, other values are errors"),
+                    ("isam_board_temperature_celsius","Temperature of the sensor"),
+                    ("isam_board_temperature_warning_celsius","Temperature threshold of the sensor which raises an alarm (tca-low)"),
+                    ("isam_board_temperature_shutdown_celsius","Temperature threshold of the sensor which shuts the board down (shut-low)"),
+                    ("isam_pon_utilization_ratio","Utilization of the PON interface in the current interval"),
+                    ("isam_pon_onts","ONTs of the PON with an optical level"),
+                    ("isam_pon_ont_rx_min_dbm","Lowest rx optical level of the ONTs of the PON"),
+                    ("isam_pon_ont_rx_mean_dbm","Mean rx optical level of the ONTs of the PON"),
+                    ("isam_pon_onts_low","ONTs of the PON at or below the warning rx level"),
+                    ("isam_power_supply_state","State of the power supply: 0 ok, 2 critical"),
+                    ("isam_power_supply_volts","Input voltage of the power supply"),
+                    ("isam_power_supply_amperes","Input current of the power supply"),
+                    ("isam_nt_redundancy_group_row_state","Row state of the NT protection group: 1 active"),
+                    ("isam_nt_standby_state","Standby state of the NT: 1 providing-service, 2 hot-standby, 3 cold-standby"),
+                    ("isam_auto_backup_progress","Progress of the auto-backup: 1 ongoing, 2 finished, 3 failed"),
+                    ("isam_auto_backup_error","Error of the auto-backup: 10 no error"),
+                    ("isam_poll_duration_seconds","Duration of the SNMP poll of the target"),
+                    ("isam_poll_timestamp_seconds","Time of the SNMP poll of the target, scrapes within --min-interval share a poll")]
+
+# round-trip time estimators by host, kept for the lifetime of the process (daemon, fleet) and shortest adaptive timeout
+RTT_ESTIMATORS = {}
+RTT_MIN_TIMEOUT = 0.2
+RTT_INITIAL_TIMEOUT = 1.0
+
+
+class IsamSession(object):
+#   one easysnmp session per invocation, shared by all checks
+#   the transport is opened once and reused for every request, sessions and PDUs are counted
+#   columns fetched by table are kept, so checks running in the same process share them, streamed ones only if the caller asks for it
+#   with a pipelining transport (run_many) independent requests are sent in parallel
+#   with a deadline every check gets a time budget, requests are retried while it lasts and the check ends with partial data when it is spent
+#   with parallel > 1 an easysnmp session sends independent requests from a pool of threads, every thread with its own session
+#   with a recorder (SnmpSnapshot) every fetched varbind is recorded, the daemon evaluates traps from it
+#   with a walk cache (WalkCache) table columns are shared with other processes polling the same device, dumps and snapshots never use it
+#   with usm (user, protocols, passwords and cache directory of UsmSecurity) SNMPv3 is used instead of the community, always over the async transport
+
+    def __init__(self,hostname,community,timeout=10,retries=0,max_repetitions=25,max_varbinds=32,backend=None,transport="easysnmp",window=8,deadline=0,parallel=1,walk_cache=None,usm=None):
+        self.hostname = hostname
+        self.max_repetitions = max_repetitions
+        self.max_varbinds = max_varbinds
+        self.sessions = 0
+        self.pdus = 0
+        self.rows_fetched = 0
+        self.timings = {}
+        self.columns = {}
+        self.budget = deadline
+        self.deadline = None
+        self.expired = False
+        self.rtt = RTT_ESTIMATORS.setdefault(hostname,RttEstimator()) if backend is None else RttEstimator()
+        self.open_session = None
+        self.executor = None
+        self.recorder = None
+        self.walk_cache = walk_cache if backend is None else None
+        self.cached_columns = 0
+        self.sessions += 1
+#       requests are answered by the backend if one is given, e.g. a ReplayBackend
+#       the async transport keeps several requests outstanding, see request_many
+#       SNMPv3 needs the async transport, easysnmp can neither be given the cached engine and keys nor tell the discovered ones
+        security = UsmSecurity(hostname,**usm) if usm is not None and backend is None else None
+        if backend is not None:
+            self.session = backend
+        elif transport == "async" or security is not None:
+            self.session = AsyncSnmpTransport(hostname,community,timeout,retries,window,self.rtt,security)
+        else:
+#           easysnmp is only loaded when a device is really queried, the daemon client never needs it
+#           net-snmp would parse all MIBs found on the system at start-up, numeric oids need none of them
+#           its timeout is fixed per session, with a deadline it is taken from the round-trip times of earlier sessions to the host
+#           and a session is opened again with the doubled timeout when a request timed out, see call
+            os.environ.setdefault("MIBS","")
+            from easysnmp import Session
+            self.max_timeout = timeout
+            if deadline: timeout = min(self.rtt.timeout(timeout),deadline)
+            def open_session(timeout): return Session(hostname=hostname,community=community,version=2,timeout=timeout,retries=retries,use_numeric=True)
+            self.open_session = open_session
+            self.session = open_session(timeout)
+            if parallel > 1:
+                import threading
+                from concurrent.futures import ThreadPoolExecutor
+                self.local = threading.local()
+                self.executor = ThreadPoolExecutor(max_workers=parallel)
+        self.pipelined = hasattr(self.session,"run_many")
+        self.concurrent = self.pipelined or self.executor is not None
+
+    def start_deadline(self):
+#       starts the budget of the next check, the async transport stops its retries at the same deadline
+        self.deadline = time.perf_counter() + self.budget if self.budget else None
+        self.expired = False
+        if hasattr(self.session,"deadline"): self.session.deadline = self.deadline
+
+    def remaining(self):
+#       seconds left of the budget, None without a deadline
+        if self.deadline is None: return None
+        return self.deadline - time.perf_counter()
+
+    def call(self,session,method,*args,**kwargs):
+#       one request (name of the method) over a session of a transport without own retries (easysnmp or a backend)
+#       with a deadline a timed out request is sent again as long as the budget lasts
+#       an easysnmp session is replaced by one with the doubled timeout, at most the configured timeout and the rest of the budget
+        while True:
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0: raise SnmpDeadlineError("Deadline of %gs exceeded" % self.budget)
+            started = time.perf_counter()
+            try:
+                result = getattr(session,method)(*args,**kwargs)
+            except Exception as e:
+                remaining = self.remaining()
+                if remaining is None or "timeout" not in type(e).__name__.lower(): raise
+                if remaining < RTT_MIN_TIMEOUT: raise SnmpDeadlineError("Deadline of %gs exceeded" % self.budget)
+                if self.open_session is not None: session = self.reopen(session,min(2*session.timeout,self.max_timeout,remaining))
+                continue
+            if not self.pipelined: self.rtt.update(time.perf_counter() - started)
+            return result
+
+    def reopen(self,session,timeout):
+#       easysnmp session with another timeout in place of session, the main session or the one of the current pool thread
+        reopened = self.open_session(timeout)
+        self.sessions += 1
+        if session is self.session: self.session = reopened
+        else: self.local.session = reopened
+        return reopened
+
+    def account(self,oid,started,rows):
+#       adds the duration of a request since started to the oid (column or subtree) and counts the rows fetched
+        self.timings[oid] = self.timings.get(oid,0) + time.perf_counter() - started
+        self.rows_fetched += rows
+
+    def snapshot(self):
+#       counters to measure a part of the session, see timing_perfdata
+        return (time.perf_counter(),self.pdus,self.rows_fetched,dict(self.timings))
+
+    def request_many(self,pdu_type,requests,max_repetitions=0):
+#       sends GET or GETBULK requests (lists of oids), in parallel if the transport pipelines them, one after the other otherwise
+#       returns the varbinds or the exception of every request
+        if self.pipelined: return self.session.run_many([(pdu_type,oids,0,max_repetitions) for oids in requests])
+        def send(session,oids):
+            try:
+                if pdu_type == BER_GETBULK: return self.call(session,"get_bulk",oids,non_repeaters=0,max_repetitions=max_repetitions)
+                return self.call(session,"get",oids)
+            except Exception as e:
+                return e
+        if self.executor is not None and len(requests) > 1:
+            return list(self.executor.map(lambda oids: send(self.thread_session(),oids),requests))
+        return [send(self.session,oids) for oids in requests]
+
+    def thread_session(self):
+#       easysnmp session of a pool thread, opened with the first request of the thread and used for all later ones
+        if not hasattr(self.local,"session"):
+            self.local.session = self.open_session(self.session.timeout)
+            self.sessions += 1
+        return self.local.session
+
+    def get_many(self,oids,max_varbinds=None):
+#       GET several scalars with as few requests as possible, at most max_varbinds per PDU
+#       a request the agent can not answer in one message is split in halves
+#       returns a dict oid -> varbind, oids the agent does not know or which were not fetched before the deadline map to None
+        max_varbinds = max_varbinds or self.max_varbinds
+        result = {}
+        pending = [list(oids[i:i+max_varbinds]) for i in range(0,len(oids),max_varbinds)]
+
+        while pending:
+#           a pipelining transport or the thread pool gets all outstanding chunks at once
+            chunks = pending if self.concurrent else pending[:1]
+            pending = pending[len(chunks):]
+            self.pdus += len(chunks)
+            started = time.perf_counter()
+            for chunk,varbinds in zip(chunks,self.request_many(BER_GET,chunks)):
+                if isinstance(varbinds,SnmpDeadlineError):
+                    self.expired = True
+                    for oid in chunk: result[oid] = None
+                    continue
+                if isinstance(varbinds,Exception):
+                    if len(chunk) == 1 or "timeout" in type(varbinds).__name__.lower(): raise varbinds
+                    pending[:0] = [chunk[:len(chunk)//2],chunk[len(chunk)//2:]]
+                    continue
+#               the request is accounted to the common subtree of its oids
+                self.account(".".join(os.path.commonprefix([oid.split(".") for oid in chunk])),started,len(varbinds))
+                for oid,item in zip(chunk,varbinds):
+                    if self.recorder is not None: self.recorder.add(oid,item.value,item.snmp_type)
+                    if item.snmp_type in ["NOSUCHOBJECT","NOSUCHINSTANCE","ENDOFMIBVIEW"]: result[oid] = None
+                    else: result[oid] = item
+
+        return result
+
+    def table(self,columns,max_repetitions=None):
+#       fetch several columns of the same table in one GETBULK stream, see stream
+#       returns a dict column-oid -> list of varbinds in walk order, the columns are kept for later checks
+        result = dict((column,[]) for column in columns)
+        for index,column,item in self.stream(columns,max_repetitions,keep=True): result[column].append(item)
+        return result
+
+    def stream(self,columns,max_repetitions=None,keep=False):
+#       generator of (index, column, varbind) of several columns of the same table, merged by index so the cells of a row follow each other
+#       the fetched columns advance in lockstep, every response carries max_repetitions rows of all columns which are still inside their subtree,
+#       a varbind is held only until the other columns reached its index, a column stopped by the deadline ends early
+#       columns kept by an earlier table call are served from memory, with a walk cache the others are read from it or fetched and written to it, see fetch_cached
+#       only with keep the columns are kept for later checks, not if the deadline stopped one of them
+        import collections
+        sources = dict((column,iter(self.columns[column])) for column in columns if column in self.columns)
+        active = [column for column in columns if column not in sources]
+        if self.walk_cache is None: fetching = self.fetch(active,max_repetitions)
+        else:
+            cached,fetching = self.fetch_cached(active,max_repetitions)
+            sources.update(cached)
+        queues = dict((column,collections.deque()) for column in columns if column not in sources)
+        kept = dict((column,[]) for column in columns if column not in self.columns) if keep else {}
+        ended = set()
+        complete = False
+
+        def pull(column):
+#           next varbind of a column, None at its end
+#           the varbinds of the other columns which arrive meanwhile wait in their queues
+            if column in sources: return next(sources[column],None)
+            queue = queues[column]
+            while not queue and column not in ended:
+                fetched,item = next(fetching)
+                if item is None: ended.add(fetched)
+                else: queues[fetched].append(item)
+            return queue.popleft() if queue else None
+
+        try:
+            heads = {}
+            for column in columns:
+                item = pull(column)
+                if item is not None: heads[column] = (oid_index(full_oid(item),column),item)
+            while heads:
+                index = min(head[0] for head in heads.values())
+                for column in columns:
+                    head = heads.get(column)
+                    if head is None or head[0] != index: continue
+                    if column in kept: kept[column].append(head[1])
+                    yield index,column,head[1]
+                    item = pull(column)
+                    if item is None: del heads[column]
+                    else: heads[column] = (oid_index(full_oid(item),column),item)
+#           all columns ended, the fetch returns whether they are complete and finishes the entries of the walk cache
+            try:
+                next(fetching)
+            except StopIteration as stop:
+                complete = stop.value
+        finally:
+            fetching.close()
+        if complete: self.columns.update(kept)
+
+    def fetch(self,columns,max_repetitions=None):
+#       GETBULK streams of the columns, yields (column, varbind) as they arrive and (column, None) at the end of every column
+#       returns False if the deadline stopped a column, it ends with the varbinds fetched so far
+#       an agent which does not move forward (no varbinds, a repeated or lower oid) raises SnmpError, its table would be truncated or never end
+        max_repetitions = max_repetitions or self.max_repetitions
+        active = list(columns)
+        cursor = dict((column,column) for column in active)
+        streams = [active]
+        partial = False
+
+        while active:
+            started = time.perf_counter()
+            previous = dict(cursor)
+            replies = self.request_many(BER_GETBULK,[[cursor[column] for column in stream] for stream in streams],max_repetitions*len(active)//len(streams[0]))
+            self.pdus += len(streams)
+            elapsed = time.perf_counter() - started
+            done = set()
+            moved = set()
+
+#           varbinds are returned row by row, so the position modulo the number of requested columns is the column
+#           a stream stopped by the deadline keeps the rows fetched so far
+            for stream,varbinds in zip(streams,replies):
+                if isinstance(varbinds,SnmpDeadlineError):
+                    self.expired = True
+                    partial = True
+                    done.update(stream)
+                    for column in stream: yield column,None
+                    continue
+                if isinstance(varbinds,Exception): raise varbinds
+                for i,item in enumerate(varbinds):
+                    column = stream[i % len(stream)]
+                    if column in done: continue
+                    oid = full_oid(item)
+                    if item.snmp_type == "ENDOFMIBVIEW" or not oid.startswith(column + "."):
+                        done.add(column)
+                        yield column,None
+                        continue
+                    if oid == cursor[column]: raise SnmpError("OID not increasing: %s" % oid)
+                    self.rows_fetched += 1
+                    cursor[column] = oid
+                    moved.add(column)
+                    if self.recorder is not None: self.recorder.add(oid,item.value,item.snmp_type)
+                    yield column,item
+
+#           the columns of a response share its duration
+            for column in active: self.timings[column] = self.timings.get(column,0) + elapsed/len(active)
+
+            active = [column for column in active if column not in done]
+#           every response has to move the columns it answered forward, otherwise the walk would never end
+            if active and not moved: raise SnmpError("No progress in the walk of %s" % ", ".join(active))
+            for column in active:
+                if column in moved and tuple(map(int,cursor[column].split("."))) <= tuple(map(int,previous[column].split("."))):
+                    raise SnmpError("OID not increasing: %s" % cursor[column])
+#           a table which did not fit into the first response is continued with one stream per column by a pipelining transport or the thread pool,
+#           every stream asks for as many varbinds as a response of all columns carries, so the table takes fewer round trips
+            if self.concurrent: streams = [[column] for column in active]
+            else: streams = [active]
+
+        return not partial
+
+    def fetch_cached(self,columns,max_repetitions=None):
+#       columns another process fetched within the ttl of the walk cache are read from it
+#       the missing ones are locked while they are fetched, concurrent processes wait for the lock and read them instead of walking them again
+#       entries are read completely and unlocked before the first varbind is taken, a slow consumer only holds the locks of the columns it fetches
+#       the waits for the locks end with the deadline, a column still locked by its writer is fetched without being written
+#       returns iterators of the cached varbinds by column and a generator fetching the others, see fetch_stored
+        cached = {}
+        locked = {}
+        try:
+            for column in columns:
+                items = self.walk_cache.load(self.hostname,column,self.remaining())
+                if items is not None: cached[column] = items
+            missing = [column for column in columns if column not in cached]
+            if missing: locked = self.walk_cache.lock(self.hostname,missing,self.remaining())
+#           filled by the process which held the lock
+            for column,f in list(locked.items()):
+                items = self.walk_cache.read(f)
+                if items is None: continue
+                cached[column] = items
+                del locked[column]
+                f.close()
+        except BaseException:
+            self.walk_cache.release(locked)
+            raise
+        self.cached_columns += len(cached)
+        if self.recorder is not None: cached = dict((column,self.record(items)) for column,items in cached.items())
+        return cached,self.fetch_stored([column for column in columns if column not in cached],max_repetitions,locked)
+
+    def fetch_stored(self,columns,max_repetitions,locked):
+#       fetch of the columns missing in the walk cache, the locked ones are written to their entries in chunks of max_repetitions varbinds as they arrive
+#       an entry becomes valid at the end of a complete fetch, one stopped by the deadline or an error is left empty, see WalkCache.begin
+        chunks = dict((column,[]) for column in locked)
+        size = max_repetitions or self.max_repetitions
+        complete = False
+        try:
+            for f in locked.values(): self.walk_cache.begin(f)
+            fetching = self.fetch(columns,max_repetitions)
+            while True:
+                try:
+                    column,item = next(fetching)
+                except StopIteration as stop:
+                    complete = stop.value
+                    break
+                chunk = chunks.get(column)
+                if chunk is not None and item is not None:
+                    chunk.append(item)
+                    if len(chunk) >= size:
+                        self.walk_cache.append(locked[column],chunk)
+                        del chunk[:]
+                yield column,item
+            if complete:
+                for column,f in locked.items():
+                    if chunks[column]: self.walk_cache.append(f,chunks[column])
+                    self.walk_cache.end(f)
+            return complete
+        finally:
+            if not complete:
+                for f in locked.values(): f.truncate(0)
+            self.walk_cache.release(locked)
+
+    def record(self,items):
+#       passes the varbinds of a walk cache entry to the recorder as they are taken
+        for item in items:
+            self.recorder.add(item.oid,item.value,item.snmp_type)
+            yield item
+
+    def stream_values(self,oid,decode=str,max_repetitions=None,keep=False):
+#       generator of (index, value) of one column, decoded as the walk returns them, see stream
+        for index,column,item in self.stream([oid],max_repetitions,keep): yield index,decode(item.value)
+
+    def stream_rows(self,columns,max_repetitions=None,keep=False):
+#       generator of rows of (name, column-oid, decode) columns joined by index while the table is streamed, see stream
+#       the cells of a row follow each other in the stream, so only the current row is held, cells the agent did not return are None
+        row_type = table_row_type(tuple(name for name,oid,decode in columns))
+        position = dict((oid,i) for i,(name,oid,decode) in enumerate(columns))
+        row = None
+        for index,column,item in self.stream([oid for name,oid,decode in columns],max_repetitions,keep):
+            if row is None or row.index != index:
+                if row is not None: yield row
+                row = new_row(row_type,index)
+            name,oid,decode = columns[position[column]]
+            setattr(row,name,decode(item.value))
+        if row is not None: yield row
+
+    def close(self):
+#       the async transport owns a socket and an event loop, easysnmp sessions are closed by garbage collection
+        if hasattr(self.session,"close"): self.session.close()
+        if self.executor is not None: self.executor.shutdown()
+
+    def stats(self):
+        if self.walk_cache is not None: return "SNMP - sessions: %i, PDUs: %i, cached columns: %i" % (self.sessions,self.pdus,self.cached_columns)
+        return "SNMP - sessions: %i, PDUs: %i" % (self.sessions,self.pdus)
+
+
+class SnmpVarbind(object):
+#   varbind of a dump or the async transport with the attributes of an easysnmp SNMPVariable
+
+    __slots__ = ("oid","oid_index","value","snmp_type")
+
+    def __init__(self,oid,value,snmp_type):
+        self.oid = oid
+        self.oid_index = ""
+        self.value = value
+        self.snmp_type = snmp_type
+
+    def __repr__(self):
+        return "<SnmpVarbind value='%s' (oid='%s', snmp_type='%s')>" % (self.value,self.oid,self.snmp_type)
+
+
+def ber_encode_length(length):
+#   short form below 128, long form with the number of length octets first
+
+    if length < 0x80: return bytes([length])
+    octets = length.to_bytes((length.bit_length()+7)//8,"big")
+    return bytes([0x80 | len(octets)]) + octets
+
+
+def ber_encode_tlv(tag,payload):
+    return bytes([tag]) + ber_encode_length(len(payload)) + payload
+
+
+def ber_encode_integer(value,tag=BER_INTEGER):
+#   two's complement for INTEGER, unsigned with a leading zero octet for counters, gauges and timeticks
+
+    if tag == BER_INTEGER: payload = value.to_bytes(max(1,(value+(value < 0)).bit_length()//8+1),"big",signed=True)
+    else: payload = value.to_bytes(value.bit_length()//8+1,"big")
+    return ber_encode_tlv(tag,payload)
+
+
+def ber_encode_oid(oid):
+#   first two arcs are packed into one octet, the others in base 128
+
+    arcs = [int(arc) for arc in oid.strip(".").split(".")] if isinstance(oid,str) else list(oid)
+    payload = bytearray([arcs[0]*40 + arcs[1]])
+    for arc in arcs[2:]:
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | arc & 0x7f)
+            arc >>= 7
+        payload += bytes(reversed(chunk))
+    return ber_encode_tlv(BER_OBJECT_IDENTIFIER,bytes(payload))
+
+
+def ber_encode_value(tag,value):
+#   value of a varbind, value is an int, bytes, an oid or None depending on the tag
+
+    if tag in (BER_INTEGER,BER_COUNTER32,BER_GAUGE32,BER_TIMETICKS,BER_COUNTER64): return ber_encode_integer(value,tag)
+    if tag == BER_OBJECT_IDENTIFIER: return ber_encode_oid(value)
+    if tag in (BER_NULL,BER_NOSUCHOBJECT,BER_NOSUCHINSTANCE,BER_ENDOFMIBVIEW): return ber_encode_tlv(tag,b"")
+    return ber_encode_tlv(tag,value)
+
+
+def ber_encode_pdu(pdu_type,request_id,varbinds,error_status=0,error_index=0):
+#   varbinds are (oid, tag, value) tuples
+#   for GETBULK error_status and error_index carry non-repeaters and max-repetitions
+
+    payload = b"".join(ber_encode_tlv(BER_SEQUENCE,ber_encode_oid(oid) + ber_encode_value(tag,value)) for oid,tag,value in varbinds)
+    pdu = ber_encode_integer(request_id) + ber_encode_integer(error_status) + ber_encode_integer(error_index) + ber_encode_tlv(BER_SEQUENCE,payload)
+    return ber_encode_tlv(pdu_type,pdu)
+
+
+def ber_encode_message(community,pdu_type,request_id,varbinds,error_status=0,error_index=0):
+#   SNMPv2c message, see ber_encode_pdu
+
+    pdu = ber_encode_pdu(pdu_type,request_id,varbinds,error_status,error_index)
+    return ber_encode_tlv(BER_SEQUENCE,ber_encode_integer(1) + ber_encode_tlv(BER_OCTET_STRING,community) + pdu)
+
+
+def ber_decode_tlv(data,pos):
+#   returns tag, start and end of the value
+
+    tag = data[pos]
+    length = data[pos+1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[pos:pos+size],"big")
+        pos += size
+    return tag,pos,pos+length
+
+
+def ber_decode_oid(payload):
+    arcs = [payload[0]//40,payload[0]%40] if payload[0] < 80 else [2,payload[0]-80]
+    arc = 0
+    for octet in payload[1:]:
+        arc = arc << 7 | octet & 0x7f
+        if not octet & 0x80:
+            arcs.append(arc)
+            arc = 0
+    return tuple(arcs)
+
+
+def ber_decode_value(tag,payload):
+    if tag == BER_INTEGER: return int.from_bytes(payload,"big",signed=True)
+    if tag in (BER_COUNTER32,BER_GAUGE32,BER_TIMETICKS,BER_COUNTER64): return int.from_bytes(payload,"big")
+    if tag == BER_OBJECT_IDENTIFIER: return ber_decode_oid(payload)
+    if tag in (BER_NULL,BER_NOSUCHOBJECT,BER_NOSUCHINSTANCE,BER_ENDOFMIBVIEW): return None
+    return bytes(payload)
+
+
+def ber_decode_message(data):
+#   returns community, pdu type, request id, error status, error index and varbinds as (oid, tag, value) tuples
+
+    data = memoryview(data)
+    tag,pos,end = ber_decode_tlv(data,0)
+    tag,pos,end = ber_decode_tlv(data,pos)
+    tag,pos,end = ber_decode_tlv(data,end)
+    community = bytes(data[pos:end])
+    return (community,) + ber_decode_pdu(data,end)
+
+
+def ber_decode_pdu(data,pos):
+#   returns pdu type, request id, error status, error index and varbinds of the pdu at pos
+
+    pdu_type,pos,end = ber_decode_tlv(data,pos)
+    fields = []
+    for i in range(3):
+        tag,pos,end = ber_decode_tlv(data,pos)
+        fields.append(int.from_bytes(data[pos:end],"big",signed=True))
+        pos = end
+    tag,pos,list_end = ber_decode_tlv(data,pos)
+    varbinds = []
+    while pos < list_end:
+        tag,pos,end = ber_decode_tlv(data,pos)
+        tag,oid_pos,oid_end = ber_decode_tlv(data,pos)
+        tag,value_pos,value_end = ber_decode_tlv(data,oid_end)
+        varbinds.append((ber_decode_oid(data[oid_pos:oid_end]),tag,ber_decode_value(tag,data[value_pos:value_end])))
+        pos = end
+    return pdu_type,fields[0],fields[1],fields[2],varbinds
+
+
+def ber_decode_v3_message(data):
+#   SNMPv3 message with USM security parameters, returns msgID, msgFlags, (engine id, boots, time, user, auth params, priv params),
+#   the position of the auth params in data and the scoped pdu, the contents of the octet string if it is encrypted
+
+    data = memoryview(data)
+    tag,pos,end = ber_decode_tlv(data,0)
+    tag,pos,end = ber_decode_tlv(data,pos)
+    if int.from_bytes(data[pos:end],"big") != 3: raise ValueError("not an SNMPv3 message")
+    tag,pos,end = ber_decode_tlv(data,end)
+    fields = []
+    for i in range(4):
+        tag,pos,field_end = ber_decode_tlv(data,pos)
+        fields.append(bytes(data[pos:field_end]))
+        pos = field_end
+    tag,pos,data_start = ber_decode_tlv(data,end)
+    tag,pos,end = ber_decode_tlv(data,pos)
+    security = []
+    for i in range(6):
+        tag,pos,end = ber_decode_tlv(data,pos)
+        if i == 4: auth_pos = pos
+        security.append(int.from_bytes(data[pos:end],"big") if i in (1,2) else bytes(data[pos:end]))
+        pos = end
+    tag,pos,end = ber_decode_tlv(data,data_start)
+    if tag == BER_SEQUENCE: pos = data_start
+    return int.from_bytes(fields[0],"big"),fields[2][0],tuple(security),auth_pos,bytes(data[pos:end])
+
+
+def ber_decode_scoped_pdu(data):
+#   returns context engine id and the fields of the pdu, see ber_decode_pdu
+
+    data = memoryview(data)
+    tag,pos,end = ber_decode_tlv(data,0)
+    tag,pos,end = ber_decode_tlv(data,pos)
+    context_engine_id = bytes(data[pos:end])
+    tag,pos,end = ber_decode_tlv(data,end)
+    return (context_engine_id,) + ber_decode_pdu(data,end)
+
+
+def ber_varbind(oid,tag,value):
+#   SnmpVarbind with the value as string like easysnmp returns it
+
+    snmp_type = BER_TYPES.get(tag,"OCTETSTR")
+    if value is None: value = snmp_type
+    elif tag == BER_IPADDRESS: value = ".".join(map(str,value))
+    elif isinstance(value,bytes):
+        try: value = value.decode("utf-8")
+        except UnicodeDecodeError: value = value.decode("latin-1")
+    elif isinstance(value,tuple): value = ".".join(map(str,value))
+    else: value = str(value)
+    return SnmpVarbind("." + ".".join(map(str,oid)),value,snmp_type)
+
+
+class SnmpTimeoutError(Exception):
+    pass
+
+
+class SnmpDeadlineError(Exception):
+    pass
+
+
+class SnmpError(Exception):
+    pass
+
+
+class RttEstimator(object):
+#   smoothed round-trip time and its variation of one host like TCP does it (RFC 6298)
+#   gives the timeout of a request: srtt + 4 * rttvar, at least RTT_MIN_TIMEOUT and at most the configured timeout
+#   before the first reply of the host RTT_INITIAL_TIMEOUT is used
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+
+    def update(self,sample):
+        if self.srtt is None:
+            self.srtt,self.rttvar = sample,sample/2
+        else:
+            self.rttvar = 0.75*self.rttvar + 0.25*abs(self.srtt - sample)
+            self.srtt = 0.875*self.srtt + 0.125*sample
+
+    def timeout(self,default):
+        if self.srtt is None: return min(default,RTT_INITIAL_TIMEOUT)
+        return min(default,max(RTT_MIN_TIMEOUT,self.srtt + 4*self.rttvar))
+
+
+def usm_password_key(password,hash_name):
+#   key of a password (RFC 3414 A.2.1), the hash of the password repeated to 1 MB
+
+    import hashlib
+    password = password.encode()
+    return hashlib.new(hash_name,(password*(1048576//len(password) + 1))[:1048576]).digest()
+
+
+def usm_localize_key(key,engine_id,hash_name):
+#   key of a password for one engine id (RFC 3414 A.2.2)
+
+    import hashlib
+    return hashlib.new(hash_name,key + engine_id + key).digest()
+
+
+class UsmSecurity(object):
+#   SNMPv3 user-based security model of one user towards one device for the async transport (RFC 3414, AES RFC 3826, SHA-256 RFC 7860)
+#   the security level follows the passwords: authPriv with a privacy password, authNoPriv with an authentication password only
+#   the engine id, boots and time of the device and the keys localized to it are kept in a cache file per host,
+#   so a new process sends its first request right away instead of discovering the engine and hashing the passwords
+#   keys are cached under a fingerprint of user, protocols, passwords and engine id once a reply authenticated with them, a changed password is localized again
+#   AES and DES need the cryptography package, it is only imported with a privacy password
+
+    def __init__(self,hostname,user,auth_protocol="SHA",auth_password=None,priv_protocol="AES",priv_password=None,cache_dir=None):
+        import random
+        self.user = user.encode()
+        self.auth_protocol = auth_protocol if auth_password else None
+        self.auth_password = auth_password
+        self.priv_protocol = priv_protocol if auth_password and priv_password else None
+        self.priv_password = priv_password
+        self.hash_name,self.mac_length = USM_AUTH_PROTOCOLS.get(self.auth_protocol,(None,0))
+        self.salt = random.getrandbits(64)
+        self.path = os.path.join(cache_dir,"%s.usm" % hostname.replace(os.sep,"_")) if cache_dir else None
+        self.cache = load_state(self.path) if self.path else {}
+        self.changed = False
+        self.engine_id = bytes.fromhex(self.cache.get("engine_id",""))
+        self.engine_boots = self.cache.get("boots",0)
+        self.engine_time = self.cache.get("time",0)
+        self.synced = self.cache.get("synced",time.time())
+        self.auth_key = self.priv_key = None
+        self.confirmed = False
+        if self.engine_id: self.localize()
+
+    def localize(self):
+#       keys of the passwords for the engine id, from the cache if the fingerprint matches
+        import hashlib
+        if not self.auth_protocol: return
+        fingerprint = hashlib.sha256(b"\0".join([self.user,str(self.auth_protocol).encode(),self.auth_password.encode(),str(self.priv_protocol).encode(),
+                                                  (self.priv_password or "").encode(),self.engine_id])).hexdigest()
+        self.fingerprint = fingerprint
+        keys = self.cache.get("keys",{}).get(fingerprint)
+        if keys is None:
+            auth_key = usm_localize_key(usm_password_key(self.auth_password,self.hash_name),self.engine_id,self.hash_name)
+            priv_key = usm_localize_key(usm_password_key(self.priv_password,self.hash_name),self.engine_id,self.hash_name) if self.priv_protocol else b""
+            keys = [auth_key.hex(),priv_key.hex()]
+        self.auth_key,self.priv_key = [bytes.fromhex(key) for key in keys]
+
+    def set_engine(self,engine_id,boots,engine_time):
+#       engine state from an authenticated response or a report, the cached keys are dropped if the engine id is not the cached one
+        if engine_id and engine_id != self.engine_id:
+            if engine_id.hex() != self.cache.get("engine_id"): self.cache["keys"] = {}
+            self.engine_id = engine_id
+            self.localize()
+            self.changed = True
+        if boots or engine_time:
+            if boots != self.engine_boots or abs(engine_time - self.current_time()) > 10: self.changed = True
+            self.engine_boots,self.engine_time,self.synced = boots,engine_time,time.time()
+
+    def current_time(self):
+        return max(0,min(self.engine_time + int(time.time() - self.synced),0x7fffffff))
+
+    def cipher(self,iv):
+#       AES-128 in CFB mode or DES in CBC mode, CFB and DES moved to the decrepit module of newer cryptography releases
+        from cryptography.hazmat.primitives.ciphers import Cipher,algorithms,modes
+        try:
+            from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+            from cryptography.hazmat.decrepit.ciphers.modes import CFB
+        except ImportError:
+            TripleDES,CFB = algorithms.TripleDES,modes.CFB
+        if self.priv_protocol == "AES": return Cipher(algorithms.AES(self.priv_key[:16]),CFB(iv))
+        return Cipher(TripleDES(self.priv_key[:8]*3),modes.CBC(iv))
+
+    def iv(self,boots,engine_time,priv_params):
+#       AES: boots, time and the salt, DES: the pre-IV of the key xor the salt
+        if self.priv_protocol == "AES": return boots.to_bytes(4,"big") + engine_time.to_bytes(4,"big") + priv_params
+        return bytes(a ^ b for a,b in zip(self.priv_key[8:16],priv_params))
+
+    def encode(self,pdu_type,request_id,varbinds,error_status=0,error_index=0):
+#       SNMPv3 message with request_id as msgID, without an engine id it is a discovery request without authentication
+        import hmac
+        discovery = not self.engine_id
+        auth = self.auth_key is not None and not discovery
+        priv = auth and self.priv_protocol is not None
+        boots,engine_time = (0,0) if discovery else (self.engine_boots,self.current_time())
+        data = ber_encode_tlv(BER_SEQUENCE,ber_encode_tlv(BER_OCTET_STRING,self.engine_id) + ber_encode_tlv(BER_OCTET_STRING,b"") +
+                              ber_encode_pdu(pdu_type,request_id,varbinds,error_status,error_index))
+        priv_params = b""
+        if priv:
+            self.salt = (self.salt + 1) & 0xffffffffffffffff
+            priv_params = self.salt.to_bytes(8,"big") if self.priv_protocol == "AES" else boots.to_bytes(4,"big") + (self.salt & 0xffffffff).to_bytes(4,"big")
+            if self.priv_protocol == "DES": data += bytes(-len(data) % 8)
+            encryptor = self.cipher(self.iv(boots,engine_time,priv_params)).encryptor()
+            data = ber_encode_tlv(BER_OCTET_STRING,encryptor.update(data) + encryptor.finalize())
+        auth_params = ber_encode_tlv(BER_OCTET_STRING,bytes(self.mac_length if auth else 0))
+        priv_params = ber_encode_tlv(BER_OCTET_STRING,priv_params)
+        security = ber_encode_tlv(BER_SEQUENCE,ber_encode_tlv(BER_OCTET_STRING,self.engine_id) + ber_encode_integer(boots) + ber_encode_integer(engine_time) +
+                                  ber_encode_tlv(BER_OCTET_STRING,self.user) + auth_params + priv_params)
+        header = ber_encode_tlv(BER_SEQUENCE,ber_encode_integer(request_id) + ber_encode_integer(65507) + ber_encode_tlv(BER_OCTET_STRING,bytes([auth | priv << 1 | 4])) + ber_encode_integer(3))
+        message = ber_encode_tlv(BER_SEQUENCE,ber_encode_integer(3) + header + ber_encode_tlv(BER_OCTET_STRING,security) + data)
+        if auth:
+#           the HMAC of the message with zeroed auth params replaces them
+            pos = len(message) - len(data) - len(priv_params) - len(auth_params) + 2
+            message = message[:pos] + hmac.new(self.auth_key,message,self.hash_name).digest()[:self.mac_length] + message[pos+self.mac_length:]
+        return message
+
+    def decode(self,data):
+#       returns the fields of a reply like ber_decode_message with the msgID as request id, None if its HMAC is wrong
+        import hmac
+        msg_id,flags,security,auth_pos,scoped = ber_decode_v3_message(data)
+        engine_id,boots,engine_time,user,auth_params,priv_params = security
+        if flags & 1:
+            if self.auth_key is None or len(auth_params) != self.mac_length: return None
+            zeroed = bytes(data[:auth_pos]) + bytes(self.mac_length) + bytes(data[auth_pos+self.mac_length:])
+            if not hmac.compare_digest(hmac.new(self.auth_key,zeroed,self.hash_name).digest()[:self.mac_length],auth_params): return None
+            self.confirmed = True
+            keys = self.cache.setdefault("keys",{})
+            if self.fingerprint not in keys:
+                keys[self.fingerprint] = [self.auth_key.hex(),self.priv_key.hex()]
+                self.changed = True
+        if flags & 2:
+            if self.priv_protocol is None: return None
+            decryptor = self.cipher(self.iv(boots,engine_time,priv_params)).decryptor()
+            scoped = decryptor.update(scoped) + decryptor.finalize()
+        context_engine_id,pdu_type,request_id,error_status,error_index,varbinds = ber_decode_scoped_pdu(scoped)
+        if flags & 1 or pdu_type == BER_REPORT: self.set_engine(engine_id,boots,engine_time)
+        return security,pdu_type,msg_id,error_status,error_index,varbinds
+
+    def report(self,varbinds):
+#       None if the request can be sent again after the report updated the engine state, the error otherwise
+#       an engine from the cache which no reply confirmed yet may be the one of a replaced device, it is discovered again on any report
+        oid = ".".join(map(str,varbinds[0][0])) if varbinds else ""
+        if oid in (USM_UNKNOWN_ENGINE_ID,USM_NOT_IN_TIME_WINDOW): return None
+        if self.engine_id and not self.confirmed:
+            self.engine_id = b""
+            self.confirmed = True
+            return None
+        return USM_REPORTS.get(oid,"report %s" % oid)
+
+    def save(self):
+#       writes the cache if the engine or the keys changed, it holds keys and is only readable by its owner
+        if not (self.path and self.changed): return
+        self.cache.update(engine_id=self.engine_id.hex(),boots=self.engine_boots,time=self.engine_time,synced=self.synced)
+        try:
+            save_state(self.path,self.cache,0o600)
+            self.changed = False
+        except OSError:
+            pass
+
+
+class AsyncSnmpTransport(object):
+#   SNMPv2c over one UDP socket per device with asyncio, used by --transport async
+#   with usm (UsmSecurity) SNMPv3, the engine is discovered before the first requests unless it is known from the cache
+#   up to window requests are outstanding at the same time and replies are matched by request-id
+#   every request has its own timeout and is sent again up to retries times
+#   with a deadline the timeout is learned from the round-trip times of the host and doubled on every retry,
+#   requests are sent again until the deadline instead of retries times
+#   the methods of an easysnmp session are provided, run_many sends a list of requests in parallel
+
+    def __init__(self,hostname,community,timeout=10,retries=0,window=8,rtt=None,usm=None):
+        import random
+        import asyncio
+        self.asyncio = asyncio
+        host,port = host_port(hostname)
+        self.hostname = hostname
+        self.community = (community or "").encode()
+        self.usm = usm
+        self.timeout = timeout
+        self.retries = retries
+        self.window = window
+        self.rtt = rtt or RttEstimator()
+        self.deadline = None
+        self.request_id = random.randint(1,0x3fffffff)
+        self.pending = {}
+        self.loop = asyncio.new_event_loop()
+        self.transport,protocol = self.loop.run_until_complete(self.loop.create_datagram_endpoint(lambda: self,remote_addr=(host,int(port))))
+
+#   datagram protocol, replies of unknown or timed out requests are dropped
+    def connection_made(self,transport):
+        pass
+
+    def connection_lost(self,exc):
+        pass
+
+    def error_received(self,exc):
+        pass
+
+    def datagram_received(self,data,addr):
+        try:
+            reply = ber_decode_message(data) if self.usm is None else self.usm.decode(data)
+        except Exception:
+            return
+        if reply is None: return
+        future = self.pending.pop(reply[2],None)
+        if future is not None and not future.done(): future.set_result(reply)
+
+    def encode(self,pdu_type,oids,non_repeaters,max_repetitions):
+#       returns the request id and the message of a request
+        self.request_id = self.request_id % 0x7fffffff + 1
+        varbinds = [(oid,BER_NULL,None) for oid in oids]
+        if self.usm is not None: return self.request_id,self.usm.encode(pdu_type,self.request_id,varbinds,non_repeaters,max_repetitions)
+        return self.request_id,ber_encode_message(self.community,pdu_type,self.request_id,varbinds,non_repeaters,max_repetitions)
+
+    async def request(self,window,pdu_type,oids,non_repeaters=0,max_repetitions=0):
+        async with window:
+            request_id,message = self.encode(pdu_type,oids,non_repeaters,max_repetitions)
+            attempt = 0
+            reports = 0
+            while True:
+                timeout = self.timeout
+                if self.deadline is not None:
+                    remaining = self.deadline - time.perf_counter()
+                    if remaining <= 0: raise SnmpDeadlineError("Deadline exceeded: no reply from %s" % self.hostname)
+                    timeout = min(self.rtt.timeout(self.timeout)*2**attempt,remaining)
+                elif attempt > self.retries:
+                    raise SnmpTimeoutError("Timeout: no reply from %s" % self.hostname)
+                future = self.loop.create_future()
+                self.pending[request_id] = future
+                started = time.perf_counter()
+                self.transport.sendto(message)
+                try:
+                    reply = await self.asyncio.wait_for(future,timeout)
+                except self.asyncio.TimeoutError:
+                    self.pending.pop(request_id,None)
+                    attempt += 1
+                    continue
+#               an SNMPv3 report of an unknown engine id or of a time outside the window updated the engine state, the request is sent again with it
+                if reply[1] != BER_REPORT or self.usm is None: break
+                error = self.usm.report(reply[5])
+                reports += 1
+                if error or reports > 3: raise SnmpError("SNMPv3 %s from %s" % (error or "engine discovery failed",self.hostname))
+                request_id,message = self.encode(pdu_type,oids,non_repeaters,max_repetitions)
+#           a reply to a request sent again could belong to any of its copies, only first attempts are measured
+            if not attempt: self.rtt.update(time.perf_counter() - started)
+        community,reply_type,request_id,error_status,error_index,varbinds = reply
+        if error_status: raise SnmpError("SNMP error-status %i at varbind %i from %s" % (error_status,error_index,self.hostname))
+        return [ber_varbind(oid,tag,value) for oid,tag,value in varbinds]
+
+    def run_many(self,requests):
+#       requests are (pdu type, oids, non-repeaters, max-repetitions), returns the varbinds or the exception of every request
+        async def run():
+            window = self.asyncio.Semaphore(self.window)
+#           an SNMPv3 engine which is not known yet is discovered with an empty GET once, not by every request
+            if self.usm is not None and not self.usm.engine_id:
+                try:
+                    await self.request(window,BER_GET,[])
+                except Exception as e:
+                    return [e]*len(requests)
+            return await self.asyncio.gather(*[self.request(window,*request) for request in requests],return_exceptions=True)
+        return self.loop.run_until_complete(run())
+
+    def run_one(self,pdu_type,oids,non_repeaters=0,max_repetitions=0):
+        result = self.run_many([(pdu_type,oids,non_repeaters,max_repetitions)])[0]
+        if isinstance(result,Exception): raise result
+        return result
+
+    def get(self,oids):
+        if isinstance(oids,str): return self.run_one(BER_GET,[oids])[0]
+        return self.run_one(BER_GET,oids)
+
+    def get_bulk(self,oids,non_repeaters=0,max_repetitions=10):
+        return self.run_one(BER_GETBULK,oids,non_repeaters,max_repetitions)
+
+    def close(self):
+        if self.usm is not None: self.usm.save()
+        self.transport.close()
+        self.loop.run_until_complete(self.asyncio.sleep(0))
+        self.loop.close()
+
+
+class SnmpDump(object):
+#   snmpwalk/snmpbulkwalk text dump ("-On" or the default "iso.3.6..." output) mapped into memory
+#   records are in walk order, so every oid is found by a binary search over the file instead of parsing all of it
+#   walks continue from the offset of the record they returned last, only the pages of the walked subtrees are read
+
+    def __init__(self,path):
+        import re
+        import mmap
+        self.path = path
+        self.file = open(path,"rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ) if size else b""
+        self.record_line = re.compile(rb"(?:iso|\.?1)(?:\.\d+)+ = ")
+        self.cursors = {}
+
+    def close(self):
+        if self.data: self.data.close()
+        self.file.close()
+
+    def record_start(self,pos):
+#       first record at or after pos, continuation lines of multi-line values are skipped
+        data = self.data
+        if pos > 0:
+            pos = data.find(b"\n",pos-1)
+            pos = len(data) if pos < 0 else pos+1
+        while pos < len(data) and not self.record_line.match(data,pos):
+            pos = data.find(b"\n",pos)
+            pos = len(data) if pos < 0 else pos+1
+        return pos
+
+    def record_oid(self,pos):
+        oid = self.data[pos:self.data.find(b" = ",pos)].decode("ascii").lstrip(".")
+        if oid.startswith("iso"): oid = "1" + oid[3:]
+        return tuple(int(arc) for arc in oid.split("."))
+
+    def record(self,pos):
+#       oid, value and type of the record at pos and the start of the next record
+        end = self.record_start(pos+1)
+        line = self.data[pos:end].decode("utf-8","replace").rstrip("\n")
+        oid,text = line.split(" = ",1)
+        value,snmp_type = parse_dump_value(text)
+        return self.record_oid(pos),value,snmp_type,end
+
+    def seek(self,oid):
+#       start of the first record with an oid >= oid
+        lo,hi = 0,len(self.data)
+        while lo < hi:
+            mid = (lo+hi)//2
+            pos = self.record_start(mid)
+            if pos >= len(self.data) or self.record_oid(pos) >= oid: hi = mid
+            else: lo = pos+1
+        return self.record_start(lo)
+
+    def get(self,oid):
+        pos = self.seek(oid)
+        if pos < len(self.data):
+            found,value,snmp_type,end = self.record(pos)
+            if found == oid: return found,value,snmp_type
+        return None
+
+    def next(self,oid):
+#       the end of the last returned record is kept, so walking a subtree reads it sequentially without searching
+#       any other oid is searched once, a record with exactly that oid is stepped over
+        pos = self.cursors.pop(oid,None)
+        if pos is None:
+            pos = self.seek(oid)
+            if pos < len(self.data) and self.record_oid(pos) == oid: pos = self.record_start(pos+1)
+        if pos >= len(self.data): return None
+        found,value,snmp_type,end = self.record(pos)
+        self.cursors[found] = end
+        return found,value,snmp_type
+
+
+def parse_dump_value(text):
+#   value and easysnmp type of a dump value like 'INTEGER: 1', 'STRING: "FANT-F"' or 'Timeticks: (100) 0:00:01.00'
+
+    if text == '""': return "","OCTETSTR"
+    if text.startswith("No Such Instance"): return "NOSUCHINSTANCE","NOSUCHINSTANCE"
+    if text.startswith("No Such Object"): return "NOSUCHOBJECT","NOSUCHOBJECT"
+    if ": " not in text: return text,"OCTETSTR"
+    kind,value = text.split(": ",1)
+    snmp_type = DUMP_TYPES.get(kind,"OCTETSTR")
+    if kind == "STRING" and value.startswith('"'): value = value[1:-1]
+    elif kind == "Hex-STRING": value = bytes.fromhex(value.replace("\n"," ")).decode("latin-1")
+    elif kind == "Timeticks": value = value[1:value.index(")")]
+    elif kind == "INTEGER" and value.endswith(")"): value = value[value.rindex("(")+1:-1]
+    elif kind == "OID": value = value.lstrip(".")
+    elif snmp_type in ["GAUGE","COUNTER","COUNTER64","INTEGER"]: value = value.split()[0]
+    return value,snmp_type
+
+
+class ReplayBackend(object):
+#   answers the requests of an IsamSession from an SnmpDump like easysnmp would from the device
+
+    def __init__(self,dump):
+        self.dump = dump
+
+    def varbind(self,record):
+        oid,value,snmp_type = record
+        return SnmpVarbind("." + ".".join(map(str,oid)),value,snmp_type)
+
+    def get(self,oids):
+        result = []
+        for oid in ([oids] if isinstance(oids,str) else oids):
+            record = self.dump.get(tuple(int(arc) for arc in oid.strip(".").split(".")))
+            result.append(self.varbind(record) if record else SnmpVarbind(oid,"NOSUCHINSTANCE","NOSUCHINSTANCE"))
+        return result[0] if isinstance(oids,str) else result
+
+    def get_bulk(self,oids,non_repeaters=0,max_repetitions=10):
+        cursor = [tuple(int(arc) for arc in oid.strip(".").split(".")) for oid in oids]
+        result = []
+        for i in range(max_repetitions):
+            for n,oid in enumerate(cursor):
+                record = self.dump.next(oid)
+                if record is None:
+                    result.append(SnmpVarbind("." + ".".join(map(str,oid)),"ENDOFMIBVIEW","ENDOFMIBVIEW"))
+                else:
+                    result.append(self.varbind(record))
+                    cursor[n] = record[0]
+        return result
+
+
+def replay_files(paths):
+#   dump files of --replay, directories are expanded to the files in them
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path): files += sorted(os.path.join(path,name) for name in os.listdir(path) if os.path.isfile(os.path.join(path,name)))
+        else: files.append(path)
+    return files
+
+
+class SnmpSnapshot(object):
+#   varbinds of the last poll of a host in memory, answers like an SnmpDump so a ReplayBackend can serve the checks from it
+#   sessions record into it (IsamSession.recorder), rows re-polled after a trap replace their cells in place
+#   the sorted oid list for GETNEXT is rebuilt on the next read after oids were added or removed
+
+    def __init__(self):
+        import threading
+        self.values = {}
+        self.keys = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self,oid,value,snmp_type):
+#       a cell the agent does not know any more is removed
+        oid = tuple(int(arc) for arc in oid.strip(".").split("."))
+        with self.lock:
+            if snmp_type in ["NOSUCHOBJECT","NOSUCHINSTANCE","ENDOFMIBVIEW"]:
+                if self.values.pop(oid,None) is not None: self.keys = None
+            else:
+                if oid not in self.values: self.keys = None
+                self.values[oid] = (value,snmp_type)
+
+    def sorted_keys(self):
+        with self.lock:
+            if self.keys is None: self.keys = sorted(self.values)
+            return self.keys
+
+    def subtree(self,prefix):
+        import bisect
+        keys = self.sorted_keys()
+        return bisect.bisect_left(keys,prefix),bisect.bisect_left(keys,prefix[:-1] + (prefix[-1]+1,)) if prefix else len(keys)
+
+    def get(self,oid):
+        entry = self.values.get(oid)
+        return (oid,) + entry if entry else None
+
+    def next(self,oid):
+        import bisect
+        keys = self.sorted_keys()
+        for i in range(bisect.bisect_right(keys,oid),len(keys)):
+            record = self.get(keys[i])
+            if record: return record
+        return None
+
+    def row_cells(self,table,index):
+#       oids of all cells of a table row (index as tuple), every column of the table seen so far if the row is new
+        table = tuple(int(arc) for arc in table.split("."))
+        start,end = self.subtree(table)
+        columns = set(oid[:len(table)+1] for oid in self.sorted_keys()[start:end])
+        return [".".join(map(str,column + index)) for column in sorted(columns)]
+
+
+class WalkCache(object):
+#   table columns on disk, shared by the processes polling the same device, one file per host and column
+#   an entry is the time of the walk followed by chunks of its varbinds as (oid, value, type) tuples and None, written with marshal
+#   entries are read under a shared lock, a process which fetches a column holds an exclusive lock on its file until it is written
+#   with a timeout the wait for a lock ends, a reader counts that as a miss, entries which are locked are not removed
+#   entries older than ttl seconds are fetched again, the least recently used files are removed when the directory grows over max_size bytes
+
+    def __init__(self,path,ttl=60,max_size=64*1024*1024):
+        os.makedirs(path,exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def entry_file(self,hostname,column):
+        return os.path.join(self.path,"%s_%s.walk" % (hostname.replace(os.sep,"_"),column))
+
+    def read(self,f):
+#       iterator of the varbinds of an open entry, None if it is empty, unfinished, expired or can not be read
+#       the entry is read at once, its chunks are decoded as the varbinds are taken
+        import io
+        import marshal
+        f.seek(0)
+        data = io.BytesIO(f.read())
+        try:
+            fetched = marshal.load(data)
+        except (EOFError,ValueError,TypeError):
+            return None
+        if not isinstance(fetched,float) or not 0 <= time.time() - fetched < self.ttl: return None
+        return self.items(data)
+
+    def items(self,data):
+        import marshal
+        for chunk in iter(lambda: marshal.load(data),None):
+            for oid,value,snmp_type in chunk: yield SnmpVarbind(oid,value,snmp_type)
+
+    def flock(self,f,operation,end=None):
+#       locks an open entry, with an end (time.monotonic) the wait ends then and False is returned, an end in the past tries once
+        import fcntl
+        if end is None:
+            fcntl.flock(f,operation)
+            return True
+        while True:
+            try:
+                fcntl.flock(f,operation | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= end: return False
+                time.sleep(0.01)
+
+    def load(self,hostname,column,timeout=None):
+#       iterator of the varbinds of a column, None if there is no valid entry, a hit makes the entry the most recently used
+#       with a timeout an entry which is still locked by its writer after it is a miss
+        import fcntl
+        path = self.entry_file(hostname,column)
+        end = None if timeout is None else time.monotonic() + timeout
+        try:
+            with open(path,"rb") as f:
+                if not self.flock(f,fcntl.LOCK_SH,end): return None
+                items = self.read(f)
+            if items is not None: os.utime(path)
+        except OSError:
+            return None
+        return items
+
+    def lock(self,hostname,columns,timeout=None):
+#       opens and locks the entries of the columns in oid order, so processes locking overlapping columns do not deadlock
+#       with a timeout a column which is still locked after it is left out
+        import fcntl
+        locked = {}
+        end = None if timeout is None else time.monotonic() + timeout
+        for column in sorted(columns):
+            f = open(os.open(self.entry_file(hostname,column),os.O_RDWR | os.O_CREAT,0o666),"r+b")
+            if self.flock(f,fcntl.LOCK_EX,end): locked[column] = f
+            else: f.close()
+        return locked
+
+    def begin(self,f):
+#       replaces the entry of a locked file by an unfinished one, its time 0 makes it invalid until end writes the time of the walk
+        import marshal
+        f.seek(0)
+        f.truncate()
+        marshal.dump(0.0,f)
+
+    def append(self,f,items):
+#       adds a chunk of varbinds to an unfinished entry
+        import marshal
+        marshal.dump([(full_oid(item),item.value,item.snmp_type) for item in items],f)
+
+    def end(self,f):
+        import marshal
+        marshal.dump(None,f)
+        f.seek(0)
+        marshal.dump(time.time(),f)
+        f.flush()
+
+    def release(self,locked):
+#       unlocks the files, the entries written under the locks may push the directory over its size
+        for f in locked.values(): f.close()
+        if locked: self.evict()
+
+    def evict(self):
+#       removes the least recently used entries until the directory fits into max_size
+#       an entry is removed under its exclusive lock, one which is being read or written is skipped
+        import fcntl
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if not entry.name.endswith(".walk"): continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime,stat.st_size,entry.path))
+        size = sum(entry[1] for entry in entries)
+        for mtime,entry_size,path in sorted(entries):
+            if size <= self.max_size: break
+            try:
+                with open(path,"rb") as f:
+                    if not self.flock(f,fcntl.LOCK_EX,0): continue
+                    os.unlink(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+
+def table_row_type(names):
+#   compact row class with one slot per column, shared by all tables with the same columns
+
+    if names not in TABLE_ROW_TYPES:
+        def row_repr(row): return "<row %s: %s>" % (".".join(map(str,row.index)),", ".join("%s=%s" % (name,getattr(row,name)) for name in names))
+        TABLE_ROW_TYPES[names] = type("TableRow",(object,),{"__slots__":("index",) + names,"__repr__":row_repr})
+    return TABLE_ROW_TYPES[names]
+
+
+def new_row(row_type,index):
+#   row of a table row class with all cells None
+
+    row = row_type()
+    row.index = index
+    for name in row_type.__slots__[1:]: setattr(row,name,None)
+    return row
+
+
+class CheckResult(object):
+#   result of a single check: state, summary, long output and performance data
+#   checks return it instead of printing and exiting, the caller decides on the output format
+#   metrics are the values of the check with labels for the exporter, metric name -> list of (labels, value)
+
+    def __init__(self,name,state=3,summary="UNKNOWN - An SNMP error occured"):
+        self.name = name
+        self.state = state
+        self.summary = summary
+        self.output = []
+        self.perfdata = []
+        self.metrics = {}
+
+    def metric(self,name,value,**labels):
+        self.metrics.setdefault(name,[]).append((tuple(labels.items()),value))
+
+    def nagios(self):
+#       plugin output as expected by nagios: summary, long output, perfdata after the pipe
+        text = "\n".join([self.summary] + self.output)
+        if self.perfdata: text += "\n| " + "\n".join(self.perfdata)
+        return text
+
+    def local(self):
+#       one Check_MK local check line, long output is joined with a literal \n
+        perfdata = "|".join(self.perfdata) or "-"
+        text = "\\n".join([self.summary] + [line.replace("\n","\\n") for line in self.output if line])
+        return "%i \"%s\" %s %s" % (self.state,dict(ISAM_CHECKS)[self.name],perfdata,text)
 
+    def passive(self):
+#       plugin output of a passive check result in one line: summary, perfdata after the pipe, long output with literal \n
+        text = self.summary
+        if self.perfdata: text += " | " + " ".join(self.perfdata)
+        text += "".join("\\n" + line for line in self.output if line)
+        return text.replace("\n","\\n")
 
-def get_board_actual_type(hostname,community):
-#   query device and return actual board type
 
-    return snmp_walk("1.3.6.1.4.1.637.61.1.23.3.1.3",hostname=hostname,community=community,version=2,timeout=10,retries=0)
+def parse_nagios_output(name,state,text):
+#   rebuilds a CheckResult from nagios plugin output, e.g. an answer of the poller daemon
 
+    body,perfdata = (text.split("\n| ",1) + [""])[:2]
+    lines = body.split("\n")
+    result = CheckResult(name,state,lines[0])
+    result.output = lines[1:]
+    result.perfdata = [line for line in perfdata.split("\n") if line]
+    return result
 
-def check_isam_board_availability(hostname,community,slot_mapping,verbose):
+
+def worst_state(states):
+#   critical before warning before unknown before ok
+
+    states = list(states)
+    for state in [2,1,3]:
+        if state in states: return state
+    return 0
+
+
+def snmp_int(item,default=0):
+#   integer value of a varbind, default if the agent did not return it
+
+    if item is None: return default
+    return int(item.value)
+
+
+def full_oid(item):
+#   numeric oid including the index of a varbind, independent of how easysnmp split it
+
+    oid = item.oid
+    if item.oid_index: oid = "%s.%s" % (oid,item.oid_index)
+    if oid.startswith("iso"): oid = "1" + oid[3:]
+    return oid.lstrip(".")
+
+
+def host_port(hostname):
+#   address and port of a hostname given with -s or in the inventory, the port defaults to 161
+
+    return tuple(hostname.rsplit(":",1)) if hostname.count(":") == 1 else (hostname,"161")
+
+
+def oid_index(oid,column):
+#   index suffix of an oid below the given column as tuple of integers
+
+    return tuple(int(arc) for arc in oid[len(column)+1:].split("."))
+
+
+def pon_port(ifindex):
+#   rack, shelf, lt and port of a pon interface, encoded in its ifIndex as rack<<28 | shelf<<24 | lt<<16 | port<<8
+
+    return (ifindex >> 28 & 0xf,ifindex >> 24 & 0xf,ifindex >> 16 & 0xff,ifindex >> 8 & 0xff)
+
+
+def check_isam_board_availability(session,slot_mapping,verbose):
 #   checks the availability status of all boards
+#   the board table is folded row by row into the state, only the output lines of the boards are kept
 
+    oid_actual_type = "1.3.6.1.4.1.637.61.1.23.3.1.3"
     oid_availability_status = "1.3.6.1.4.1.637.61.1.23.3.1.8"
-    dict_availability_status = {0:"unknown",1:"available",2:"selftest in progress",3:"failed",4:"powered off",5:"not installed",6:"offline",7:"dependency"}
-    snmp_availability_status = ""
-    snmp_actual_type = ""
     code_warning = 0
     code_critical = 0
     code_unknown = 0
+    boards = 0
+    lines = []
+    result = CheckResult("board_availability")
 
-    snmp_availability_status = snmp_walk(oid_availability_status,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_actual_type = get_board_actual_type(hostname,community)
-
-    if snmp_availability_status and snmp_actual_type:
+    for row in session.stream_rows([("actual_type",oid_actual_type,str),("availability_status",oid_availability_status,int)]):
         if verbose:
-            print("\nSNMP - board availability status:")
-            for item in snmp_availability_status: print("%s" % item)
-            print("\nSNMP - board actual type:")
-            for item in snmp_actual_type: print("%s" % item)
-
-#       walk through boards and set codes
-#       ommit last board (-1) which is always unknown
-        i = 0
-        while(i < len(snmp_actual_type)-1):
-            if verbose: print("board_type: %s - availability: %s" % (snmp_actual_type[i].value,dict_availability_status[int(snmp_availability_status[i].value)]))
-            if int(snmp_availability_status[i].value) == 2: code_warning = 1
-            elif int(snmp_availability_status[i].value) in [3,4,6,7]: code_critical = 1
-            elif int(snmp_availability_status[i].value) == 0: code_unknown = 1
-            i += 1
-
-#       print plugin-output and generate performance-data
-        if code_critical: print("ISAM Board Availability-Status is CRITICAL | availability=2;1;2;0;3\n")
-        elif code_warning: print("ISAM Board Availability-Status is WARNING | availability=1;1;2;0;3\n")
-        elif code_unknown: print("ISAM Board Availability-Status is UNKNOWN | availability=3;1;2;0;3\n")
-        else: print("ISAM Board Availability-Status is OK | availability=0;1;2;0;3\n")
-
-#       loop through boards backwards -> output from plugin should be equal to board-position in chassis
-#       ommit the last board (-2) which is always unknown
-        i = len(snmp_actual_type)-2
-        while(i >= 0):
-            print("%-*s: %-*s : %s" % (11,slot_mapping[int(snmp_actual_type[i].oid.rsplit('.',1)[-1])],6,snmp_actual_type[i].value,dict_availability_status[int(snmp_availability_status[i].value)]))
-            i -= 1
-
-        if code_critical: sys.exit(2)
-        elif code_warning: sys.exit(1)
-        elif code_unknown: sys.exit(3)
-        else: sys.exit(0)
-
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
-
-
-def check_isam_board_operational_status(hostname,community,slot_mapping,verbose):
+            if not boards: print("\nSNMP - board table:")
+            print("%s" % row)
+        boards += 1
+
+#       set codes, boards without a known slot are omitted, like the last board which is always unknown
+        if row.index[0] not in slot_mapping: continue
+        if verbose: print("board_type: %s - availability: %s" % (row.actual_type,DICT_AVAILABILITY_STATUS.get(row.availability_status,"unknown")))
+        result.metric("isam_board_availability_status",row.availability_status or 0,slot=slot_mapping[row.index[0]],type=row.actual_type or "")
+        if row.availability_status == 2: code_warning = 1
+        elif row.availability_status in [3,4,6,7]: code_critical = 1
+        elif not row.availability_status: code_unknown = 1
+        lines.append("%-*s: %-*s : %s" % (11,slot_mapping[row.index[0]],6,row.actual_type or "",DICT_AVAILABILITY_STATUS.get(row.availability_status,"unknown")))
+
+    if boards:
+#       plugin-output and performance-data
+        if code_critical: result.state,result.summary = 2,"ISAM Board Availability-Status is CRITICAL"
+        elif code_warning: result.state,result.summary = 1,"ISAM Board Availability-Status is WARNING"
+        elif code_unknown: result.state,result.summary = 3,"ISAM Board Availability-Status is UNKNOWN"
+        else: result.state,result.summary = 0,"ISAM Board Availability-Status is OK"
+        result.perfdata.append("availability=%i;1;2;0;3" % result.state)
+        result.output.append("")
+
+#       boards backwards -> output from plugin should be equal to board-position in chassis
+        result.output += reversed(lines)
+
+    return result
+
+
+def check_isam_board_operational_status(session,slot_mapping,verbose):
 #   checks the operational status of all boards
+#   the board table is folded row by row into the state, only the output lines of the boards are kept
 
+    oid_actual_type = "1.3.6.1.4.1.637.61.1.23.3.1.3"
     oid_operational_status = "1.3.6.1.4.1.637.61.1.23.3.1.7"
-    dict_operational_status = {0:'unknown',1:'no-error',2:'type-mismatch',3:'board-missing',4:'board-installation-missing',5:'no-planned-board',6:'waiting-for-sw',7:'init-boot-failed',8:'init-download-failed',9:'init-connection-failed',10:'init-configuration-failed',11:'board-reset-protection',12:'invalid-parameter',13:'temperature-alarm',14:'temperature-shutdown',15:'defense',16:'board-not-licensed',17:'sem-power-fail',18:'sem-ups-fail',19:'board-in-incompatible-slot',20:'download-ongoing',255:'unknown-error'}
-    list_warning = [5,6,16,19]
-    list_critical = [2,3,4,7,8,9,10,11,12,13,14,15,17,18,20,255]
-    snmp_operational_status = ""
-    snmp_actual_type = ""
     code_warning = 0
     code_critical = 0
     code_unknown = 0
+    boards = 0
+    lines = []
+    result = CheckResult("board_oper_status")
 
-    snmp_operational_status = snmp_walk(oid_operational_status,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_actual_type = get_board_actual_type(hostname,community)
-
-    if snmp_operational_status and snmp_actual_type:
+    for row in session.stream_rows([("actual_type",oid_actual_type,str),("operational_status",oid_operational_status,int)]):
         if verbose:
-            print("\nSNMP - board operational status:")
-            for item in snmp_operational_status: print("%s" % item)
-            print("\nSNMP - board actual type:")
-            for item in snmp_actual_type: print("%s" % item)
-
-#       walk through boards and set codes
-#       ommit last board (-1) which is always unknown
-        i = 0
-        while(i < len(snmp_actual_type)-1):
-            if verbose: print("board_type: %s - operational_status: %s" % (snmp_actual_type[i].value,dict_operational_status[int(snmp_operational_status[i].value)]))
-            if int(snmp_operational_status[i].value) in list_warning: code_warning = 1
-            elif int(snmp_operational_status[i].value) in list_critical: code_critical = 1
-            elif int(snmp_operational_status[i].value) == 0: code_unknown = 1
-            i += 1
-
-#       print plugin-output and generate performance-data
-        if code_critical: print("ISAM Board Operational-Status is CRITICAL | operational_state=2;1;2;0;3\n")
-        elif code_warning: print("ISAM Board Operational-Status is WARNING | operational_state=1;1;2;0;3\n")
-        elif code_unknown: print("ISAM Board Operational-Status is UNKNOWN | operational_state=3;1;2;0;3\n")
-        else: print("ISAM Board Operational-Status is OK | operational_state=0;1;2;0;3\n")
-
-#       loop through boards backwards -> output from plugin should be equal to board-position in chassis
-#       ommit the last board (-2) which is always unknown
-        i = len(snmp_actual_type)-2
-        while(i >= 0):
-            print("%-*s: %-*s : %s" % (11,slot_mapping[int(snmp_actual_type[i].oid.rsplit('.',1)[-1])],6,snmp_actual_type[i].value,dict_operational_status[int(snmp_operational_status[i].value)]))
-            i -= 1
-
-        if code_critical: sys.exit(2)
-        elif code_warning: sys.exit(1)
-        elif code_unknown: sys.exit(3)
-        else: sys.exit(0)
-
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
-
-
-def check_isam_auto_backup_status(hostname,community,verbose):
+            if not boards: print("\nSNMP - board table:")
+            print("%s" % row)
+        boards += 1
+
+#       set codes, boards without a known slot are omitted, like the last board which is always unknown
+        if row.index[0] not in slot_mapping: continue
+        if verbose: print("board_type: %s - operational_status: %s" % (row.actual_type,DICT_OPERATIONAL_STATUS.get(row.operational_status,"unknown")))
+        result.metric("isam_board_operational_status",row.operational_status or 0,slot=slot_mapping[row.index[0]],type=row.actual_type or "")
+        if row.operational_status in OPERATIONAL_WARNING: code_warning = 1
+        elif row.operational_status in OPERATIONAL_CRITICAL: code_critical = 1
+        elif not row.operational_status: code_unknown = 1
+        lines.append("%-*s: %-*s : %s" % (11,slot_mapping[row.index[0]],6,row.actual_type or "",DICT_OPERATIONAL_STATUS.get(row.operational_status,"unknown")))
+
+    if boards:
+#       plugin-output and performance-data
+        if code_critical: result.state,result.summary = 2,"ISAM Board Operational-Status is CRITICAL"
+        elif code_warning: result.state,result.summary = 1,"ISAM Board Operational-Status is WARNING"
+        elif code_unknown: result.state,result.summary = 3,"ISAM Board Operational-Status is UNKNOWN"
+        else: result.state,result.summary = 0,"ISAM Board Operational-Status is OK"
+        result.perfdata.append("operational_state=%i;1;2;0;3" % result.state)
+        result.output.append("")
+
+#       boards backwards -> output from plugin should be equal to board-position in chassis
+        result.output += reversed(lines)
+
+    return result
+
+
+def check_isam_auto_backup_status(session,verbose):
 #   checks the status of the auto-backup feature
 
     oid_dn_progress = "1.3.6.1.4.1.637.61.1.24.2.4.0"
     oid_up_progress = "1.3.6.1.4.1.637.61.1.24.2.9.0"
     oid_dn_error = "1.3.6.1.4.1.637.61.1.24.2.5.0"
     oid_up_error = "1.3.6.1.4.1.637.61.1.24.2.10.0"
-    dict_progress = {0:"unknown",1:"ongoing",2:"finished and successfull",3:"finished but failed"}
-    dict_dn_error = {0:"unknown",1:"file not found",2:"access violation",3:"disk full - allocation needed",4:"illegal tftp-operation",5:"unknown transfer-id",6:"file already exists",7:"no such user",8:"corrupted database - incomplete database",9:"system restart",10:"no error",11:"corrupted iss-config",12:"corrupted iss-prot-config"}
-    dict_up_error = {0:"unknown",1:"file not found",2:"access violation",3:"disk full - allocation needed",4:"illegal tftp-operation",5:"unknown transfer-id",6:"file already exists",7:"no such user",8:"selected database not available",9:"system restart",10:"no error",11:"another SWDB process is ongoing"}
     snmp_dn_progress = 0
     snmp_up_progress = 0
     snmp_dn_error = 0
     snmp_up_error = 0
+    result = CheckResult("auto_backup_status")
 
-    snmp_dn_progress = snmp_get(oid_dn_progress,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_up_progress = snmp_get(oid_up_progress,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_dn_error = snmp_get(oid_dn_error,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_up_error = snmp_get(oid_up_error,hostname=hostname,community=community,version=2,timeout=10,retries=0)
+    snmp = session.get_many([oid_dn_progress,oid_up_progress,oid_dn_error,oid_up_error])
+    snmp_dn_progress = snmp[oid_dn_progress]
+    snmp_up_progress = snmp[oid_up_progress]
+    snmp_dn_error = snmp[oid_dn_error]
+    snmp_up_error = snmp[oid_up_error]
 
-    if snmp_dn_progress and snmp_up_progress and snmp_dn_error and snmp_up_error:
+    if snmp_dn_progress or snmp_up_progress or snmp_dn_error or snmp_up_error:
         if verbose:
             print("\nSNMP - download progress: %s" % snmp_dn_progress)
             print("SNMP - upload progress: %s" % snmp_up_progress)
             print("SNMP - download error: %s" % snmp_dn_error)
             print("SNMP - upload error: %s" % snmp_up_error)
 
-        if int(snmp_dn_progress.value) == 2 and int(snmp_up_progress.value) == 2 and int(snmp_dn_error.value) == 10 and int(snmp_up_error.value) == 10:
-            print("ISAM Auto-Backup is OK\nDB Download: %s => %s\nDB Upload: %s => %s" % (dict_progress[int(snmp_dn_progress.value)],dict_dn_error[int(snmp_dn_error.value)],dict_progress[int(snmp_up_progress.value)],dict_up_error[int(snmp_up_error.value)]))
-            print("| backup_status=0;1;2;0;3")
-            sys.exit(0)
+#       a missing varbind is evaluated as unknown (0) instead of failing the whole check
+        dn_progress = snmp_int(snmp_dn_progress)
+        up_progress = snmp_int(snmp_up_progress)
+        dn_error = snmp_int(snmp_dn_error)
+        up_error = snmp_int(snmp_up_error)
 
-        elif int(snmp_dn_progress.value) == 0 or int(snmp_up_progress.value) == 0 or int(snmp_dn_error.value) == 0 or int(snmp_up_error.value) == 0:
-            print("ISAM Auto-Backup is UNKNOWN\nDB Download: %s => %s\nDB Upload: %s => %s" % (dict_progress[int(snmp_dn_progress.value)],dict_dn_error[int(snmp_dn_error.value)],dict_progress[int(snmp_up_progress.value)],dict_up_error[int(snmp_up_error.value)]))
-            print("| backup_status=3;1;2;0;3")
-            sys.exit(3)
+        if dn_progress == 2 and up_progress == 2 and dn_error == 10 and up_error == 10:
+            result.state,result.summary = 0,"ISAM Auto-Backup is OK"
+
+        elif dn_progress == 0 or up_progress == 0 or dn_error == 0 or up_error == 0:
+            result.state,result.summary = 3,"ISAM Auto-Backup is UNKNOWN"
 
-        elif int(snmp_dn_progress.value) == 1 or int(snmp_up_progress.value) == 1:
-            print("ISAM Auto-Backup is WARNING\nDB Download: %s => %s\nDB Upload: %s => %s" % (dict_progress[int(snmp_dn_progress.value)],dict_dn_error[int(snmp_dn_error.value)],dict_progress[int(snmp_up_progress.value)],dict_up_error[int(snmp_up_error.value)]))
-            print("| backup_status=1;1;2;0;3")
-            sys.exit(1)
+        elif dn_progress == 1 or up_progress == 1:
+            result.state,result.summary = 1,"ISAM Auto-Backup is WARNING"
 
         else:
-            print("ISAM Auto-Backup is CRITICAL\nDB Download: %s => %s\nDB Upload: %s => %s" % (dict_progress[int(snmp_dn_progress.value)],dict_dn_error[int(snmp_dn_error.value)],dict_progress[int(snmp_up_progress.value)],dict_up_error[int(snmp_up_error.value)]))
-            print("| backup_status=2;1;2;0;3")
-            sys.exit(2)
+            result.state,result.summary = 2,"ISAM Auto-Backup is CRITICAL"
 
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
+        result.output.append("DB Download: %s => %s" % (DICT_PROGRESS.get(dn_progress,"unknown"),DICT_DN_ERROR.get(dn_error,"unknown")))
+        result.output.append("DB Upload: %s => %s" % (DICT_PROGRESS.get(up_progress,"unknown"),DICT_UP_ERROR.get(up_error,"unknown")))
+        result.output += ["%s is not available" % oid for oid in snmp if snmp[oid] is None]
+        result.perfdata.append("backup_status=%i;1;2;0;3" % result.state)
+        result.metric("isam_auto_backup_progress",dn_progress,direction="download")
+        result.metric("isam_auto_backup_progress",up_progress,direction="upload")
+        result.metric("isam_auto_backup_error",dn_error,direction="download")
+        result.metric("isam_auto_backup_error",up_error,direction="upload")
+
+    return result
 
 
-def check_isam_pon_utilization(hostname,community,warning,critical,pon_mapping,slot_mapping,verbose):
+def check_isam_pon_utilization(session,warning,critical,verbose,history=None,window=1,statistic="p95"):
 #   checks the utilization of all pon interfaces
+#   the utilization table is streamed into flat arrays of ifIndex, rx, tx and peak, no rows are kept
+#   thresholds, state counters and per LT aggregates are evaluated in one pass over the arrays when the table is complete
+#   with a history (PonHistory) every poll is added to it and the thresholds apply to the statistic of the last window polls instead of the current values
 
+    from array import array
     oid_rx = "1.3.6.1.4.1.637.61.1.35.21.57.1.7"
     oid_tx = "1.3.6.1.4.1.637.61.1.35.21.57.1.6"
-    snmp_rx = ""
-    snmp_tx = ""
-    code_warning = 0
-    code_critical = 0
-    snmp_actual_type = ""
-    perfdata = []
-
-    snmp_rx = snmp_walk(oid_rx,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_tx = snmp_walk(oid_tx,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-
-    if snmp_rx and snmp_tx and len(snmp_rx) == len(snmp_tx):
-        if verbose:
-            print("\nSNMP - rx utilization:")
-            for item in snmp_rx: print("%s" % item)
-            print("\nSNMP - tx utilization:")
-            for item in snmp_tx: print("%s" % item)
-
-#       walk through values, cast them to float, create percentage and list
-        snmp_rx = [float(item.value)/100 for item in snmp_rx]
-        snmp_tx = [float(item.value)/100 for item in snmp_tx]
-        if verbose: print("\nConverted rx values:\n%s\nConverted tx values:\n%s" % (snmp_rx,snmp_tx))
-
-#       walk through boards and set codes
-        i = 0
-        while(i < len(snmp_rx)):
-            if snmp_rx[i] >= critical or snmp_tx[i] >= critical: code_critical += 1
-            elif snmp_rx[i] >= warning or snmp_tx[i] >= warning: code_warning += 1
-            i += 1
-
-#       print plugin-output
-        if code_critical: print("%i/%i PON interfaces are reporting CRITICAL" % (code_critical,len(snmp_rx)))
-        elif code_warning: print("%i/%i PON interfaces are reporting WARNING" % (code_warning,len(snmp_rx)))
-        else: print("%i/%i PON interfaces are reporting OK" % (len(snmp_rx),len(snmp_rx)))
-
-        snmp_actual_type = get_board_actual_type(hostname,community)
-
-        if snmp_actual_type:
-            if verbose:
-                print("\nSNMP - board actual type:")
-                for item in snmp_actual_type: print("%s" % item)
-
-        index = 0
-        while(index < len(snmp_actual_type)):
-            if snmp_actual_type[index].value in pon_mapping:
-                if verbose:
-                    print("INDEX: %i - BOARD: %s" % (index-2,snmp_actual_type[index]))
-                perfdata.append(pon_mapping[snmp_actual_type[index].value])
-            else:
-                perfdata.append(0)
-            index += 1
-
-        perfdata = perfdata[2:]
-        perfdata = [int(item) for item in perfdata]
-
+    ifindexes = array("L")
+    snmp_rx = array("d")
+    snmp_tx = array("d")
+    peak = array("d")
+    result = CheckResult("pon_utilization")
+
+    for row in session.stream_rows([("rx",oid_rx,float),("tx",oid_tx,float)]):
+#       rx and tx are joined by ifIndex, interfaces with only one direction are skipped
+        if row.rx is None or row.tx is None: continue
         if verbose:
-            print("\nPERFDATA-LIST:")
-            print("%s" % perfdata)
-
-#       generate performance-data
-        print("|")
-
-        index = 0
-        while(index < len(perfdata)):
-            if perfdata[index] > 0:
-                if verbose:
-                    print("\nPerfdata for slot %i with %i ports is being generated." % (index,perfdata[index]))
-                i = 0
-                i_lt = index
-                i_pon = 1
-                while i < perfdata[index]:
-                    print("pon_1/1/%i/%i_rx=%3.2f%%;%i;%i;0;100" % (i_lt,i_pon,snmp_rx[i],warning,critical))
-                    print("pon_1/1/%i/%i_tx=%3.2f%%;%i;%i;0;100" % (i_lt,i_pon,snmp_tx[i],warning,critical))
-                    i += 1
-                    i_pon += 1
-            index += 1
-
-        if code_critical: sys.exit(2)
-        elif code_warning: sys.exit(1)
-        else: sys.exit(0)
-
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
-
-
-def check_isam_board_temperature(hostname,community,slot_mapping,verbose):
+            if not peak: print("\nSNMP - utilization table:")
+            print("%s" % row)
+
+#       values are reported in 1/100 percent, the utilization of an interface is its higher direction
+        rx,tx = row.rx/100,row.tx/100
+        ifindexes.append(row.index[0])
+        snmp_rx.append(rx)
+        snmp_tx.append(tx)
+        if history is None:
+            peak.append(max(rx,tx))
+        else:
+            history.add(row.index[0],rx,tx)
+            peak.append(max(history.window(row.index[0],window,statistic)))
+
+#   a poll cut short by the deadline is not added, its missing PONs would look idle
+    if history is not None:
+        polls = min(window,history.polls + 1,history.slots)
+        if not session.expired: history.commit()
+
+    if peak:
+#       per interface state: 2 critical, 1 warning, 0 ok
+        states = bytes((2 if value >= critical else 1 if value >= warning else 0) for value in peak)
+        code_critical = states.count(2)
+        code_warning = states.count(1)
+
+#       per LT aggregates: max, mean and number of interfaces over the warning threshold
+        ports = [pon_port(ifindex) for ifindex in ifindexes]
+        lts = {}
+        for i,(rack,shelf,lt,port) in enumerate(ports):
+            lts.setdefault((rack,shelf,lt),[]).append(i)
+
+#       plugin-output
+        if code_critical: result.state,result.summary = 2,"%i/%i PON interfaces are reporting CRITICAL" % (code_critical,len(peak))
+        elif code_warning: result.state,result.summary = 1,"%i/%i PON interfaces are reporting WARNING" % (code_warning,len(peak))
+        else: result.state,result.summary = 0,"%i/%i PON interfaces are reporting OK" % (len(peak),len(peak))
+        result.output.append("")
+        if history is not None: result.output.append("Thresholds and LT values: %s of the last %i polls" % (statistic,polls))
+
+#       performance-data per interface
+        for i,(rack,shelf,lt,port) in enumerate(ports):
+            result.perfdata.append("pon_%i/%i/%i/%i_rx=%3.2f%%;%i;%i;0;100" % (rack,shelf,lt,port,snmp_rx[i],warning,critical))
+            result.perfdata.append("pon_%i/%i/%i/%i_tx=%3.2f%%;%i;%i;0;100" % (rack,shelf,lt,port,snmp_tx[i],warning,critical))
+            result.metric("isam_pon_utilization_ratio",snmp_rx[i]/100,pon="%i/%i/%i/%i" % (rack,shelf,lt,port),direction="rx")
+            result.metric("isam_pon_utilization_ratio",snmp_tx[i]/100,pon="%i/%i/%i/%i" % (rack,shelf,lt,port),direction="tx")
+
+#       output and performance-data per LT
+        for (rack,shelf,lt),members in sorted(lts.items()):
+            values = [peak[i] for i in members]
+            over = sum(1 for i in members if states[i])
+            result.output.append("lt:%i/%i/%i: max %3.2f%%, mean %3.2f%%, %i/%i over threshold" % (rack,shelf,lt,max(values),sum(values)/len(values),over,len(members)))
+            result.perfdata.append("lt_%i/%i/%i_max=%3.2f%%;%i;%i;0;100" % (rack,shelf,lt,max(values),warning,critical))
+            result.perfdata.append("lt_%i/%i/%i_mean=%3.2f%%;;;0;100" % (rack,shelf,lt,sum(values)/len(values)))
+            result.perfdata.append("lt_%i/%i/%i_over=%i;;;0;%i" % (rack,shelf,lt,over,len(members)))
+
+    return result
+
+
+def check_isam_board_temperature(session,slot_mapping,verbose):
 #   checks the temperature sensors on all boards
 #   high-temperature thresholds are tca-low (warning) and shut-low (critical) per sensor
 #   low-temperature thresholds are hardcoded to 9°C (warning) and 5°C (critical) for all sensors
+#   the sensor table is folded row by row into state counters and perfdata, no table is kept
 
     oid_actual = "1.3.6.1.4.1.637.61.1.23.10.1.2"
     oid_tca_lo = "1.3.6.1.4.1.637.61.1.23.10.1.3"
     oid_shut_lo = "1.3.6.1.4.1.637.61.1.23.10.1.5"
-    snmp_actual_temp = ""
-    snmp_tca_lo = ""
-    snmp_shut_lo = ""
     cold_warning = 9
     cold_critical = 5
     code_warning = 0
     code_critical = 0
+    sensors = 0
+    perfdata = []
+    result = CheckResult("board_temperature")
 
-    snmp_actual_temp = snmp_walk(oid_actual,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_tca_lo = snmp_walk(oid_tca_lo,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_shut_lo = snmp_walk(oid_shut_lo,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-
-    if snmp_actual_temp and snmp_tca_lo and snmp_shut_lo:
+    for row in session.stream_rows([("actual",oid_actual,int),("tca_lo",oid_tca_lo,int),("shut_lo",oid_shut_lo,int)]):
+#       sensors are indexed by slot and sensor number, sensors with missing thresholds can not be evaluated
+        if row.actual is None or row.tca_lo is None or row.shut_lo is None: continue
         if verbose:
-            print("\nSNMP - actual temperature:")
-            for item in snmp_actual_temp: print("%s" % item)
-            print("\nSNMP - tca low:")
-            for item in snmp_tca_lo: print("%s" % item)
-            print("\nSNMP - shut low:")
-            for item in snmp_shut_lo: print("%s" % item)
-
-#       walk through sensors and set codes
-        i = 0
-        while(i < len(snmp_actual_temp)):
-            if int(snmp_actual_temp[i].value) not in range(cold_critical,int(snmp_shut_lo[i].value)):
-                code_critical += 1
-            elif int(snmp_actual_temp[i].value) not in range(cold_warning,int(snmp_tca_lo[i].value)):
-                code_warning += 1
-            i += 1
-
-#       print plugin-output
-        if code_critical: print("%i/%i temperature sensorsare reporting CRITICAL" % (code_critical,len(snmp_actual_temp)))
-        elif code_warning: print("%i/%i temperature sensors are reporting WARNING" % (code_warning,len(snmp_actual_temp)))
-        else: print("%i/%i temperature sensors are reporting OK" % (len(snmp_actual_temp),len(snmp_actual_temp)))
-
-#       generate performance-data
-#       loop through sensors backwards -> output from plugin should be equal to board-position in chassis
-        print(" |")
-        i = len(snmp_actual_temp)-1
-        while(i >= 0):
-            print("%s.%i=%i°C;%i:%i;%i:%i;;" % (slot_mapping[int(snmp_actual_temp[i].oid.rsplit('.',2)[-2])],int(snmp_actual_temp[i].oid.rsplit('.',1)[-1]),int(snmp_actual_temp[i].value),cold_warning,int(snmp_tca_lo[i].value),cold_critical,int(snmp_shut_lo[i].value)))
-            i -= 1
-
-        if code_critical: sys.exit(2)
-        elif code_warning: sys.exit(1)
-        else: sys.exit(0)
-
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
+            if not sensors: print("\nSNMP - temperature table:")
+            print("%s" % row)
+        sensors += 1
+
+#       set codes
+        if row.actual not in range(cold_critical,row.shut_lo):
+            code_critical += 1
+        elif row.actual not in range(cold_warning,row.tca_lo):
+            code_warning += 1
+
+#       performance-data
+        slot = slot_mapping.get(row.index[0]) or slot_name(row.index[0]) or "slot-%i" % row.index[0]
+        perfdata.append("%s.%i=%i°C;%i:%i;%i:%i;;" % (slot,row.index[-1],row.actual,cold_warning,row.tca_lo,cold_critical,row.shut_lo))
+        result.metric("isam_board_temperature_celsius",row.actual,slot=slot,sensor=str(row.index[-1]))
+        result.metric("isam_board_temperature_warning_celsius",row.tca_lo,slot=slot,sensor=str(row.index[-1]))
+        result.metric("isam_board_temperature_shutdown_celsius",row.shut_lo,slot=slot,sensor=str(row.index[-1]))
 
+    if sensors:
+#       plugin-output
+        if code_critical: result.state,result.summary = 2,"%i/%i temperature sensorsare reporting CRITICAL" % (code_critical,sensors)
+        elif code_warning: result.state,result.summary = 1,"%i/%i temperature sensors are reporting WARNING" % (code_warning,sensors)
+        else: result.state,result.summary = 0,"%i/%i temperature sensors are reporting OK" % (sensors,sensors)
 
-def check_isam_nt_redundancy(hostname,community,groupId,verbose):
+#       sensors backwards -> output from plugin should be equal to board-position in chassis
+        result.perfdata += reversed(perfdata)
+
+    return result
+
+
+def check_isam_nt_redundancy(session,groupId,verbose):
 #   checks the redundancy status of NT boards
 
     oid_admin_state = "1.3.6.1.4.1.637.61.1.23.5.2.1.8." + str(groupId)
@@ -339,18 +1722,17 @@ def check_isam_nt_redundancy(hostname,community,groupId,verbose):
     oid_standby_state_nta = "1.3.6.1.4.1.637.61.1.23.5.3.1.3.4353"
     oid_standby_state_ntb = "1.3.6.1.4.1.637.61.1.23.5.3.1.3.4354"
     oid_last_switch_reason = "1.3.6.1.4.1.637.61.1.23.5.2.1.5." + str(groupId)
-    dict_admin_state = {1:"unlock",2:"lock"}
-    dict_group_row_state = {1:"active", 2:"not in service", 3:"not ready", 4:"create and go", 5:"create and wait", 6:"destroy"}
-    dict_standby_state = {0:"not-supported",1:"providing-service",2:"hot-standby",3:"cold-standby",4:"idle"}
-    dict_last_switch_reason = {1:"no switchover",2:"forced active",3:"board not present",4:"extender chain failure",5:"link failure",6:"watchdog timeout",7:"filesystem corrupt",8:"configuration mismatch",9:"board unplanned",10:"board locked",11:"shelf defense",12:"revertive switchover",13:"lanx failure",14:"lanx hw-failure",15:"lanx sdk failure",16:"dpoe app failure",17:"dpoe unreachable",18:"forced switchover"}
-
-    snmp_admin_state = snmp_get(oid_admin_state,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_group_row_state = snmp_get(oid_group_row_state,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_standby_state_nta = snmp_get(oid_standby_state_nta,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_standby_state_ntb = snmp_get(oid_standby_state_ntb,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_last_switch_reason = snmp_get(oid_last_switch_reason,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-
-    if snmp_admin_state and snmp_group_row_state and snmp_standby_state_nta and snmp_standby_state_ntb and snmp_last_switch_reason:
+    result = CheckResult("nt_redundancy")
+
+    snmp = session.get_many([oid_admin_state,oid_group_row_state,oid_standby_state_nta,oid_standby_state_ntb,oid_last_switch_reason])
+    snmp_admin_state = snmp[oid_admin_state]
+    snmp_group_row_state = snmp[oid_group_row_state]
+    snmp_standby_state_nta = snmp[oid_standby_state_nta]
+    snmp_standby_state_ntb = snmp[oid_standby_state_ntb]
+    snmp_last_switch_reason = snmp[oid_last_switch_reason]
+
+#   without the row state the group can not be evaluated, any other missing varbind counts as not redundant
+    if snmp_group_row_state:
         if verbose:
             print("\nSNMP - admin state: %s" % snmp_admin_state)
             print("\nSNMP - group row state: %s" % snmp_group_row_state)
@@ -358,136 +1740,1039 @@ def check_isam_nt_redundancy(hostname,community,groupId,verbose):
             print("\nSNMP - standby state nt-b: %s" % snmp_standby_state_ntb)
             print("\nSNMP - last switchover reason: %s" % snmp_last_switch_reason)
 
-        if int(snmp_group_row_state.value) == 1:
+        admin_state = snmp_int(snmp_admin_state)
+        group_row_state = snmp_int(snmp_group_row_state)
+        standby_state_nta = snmp_int(snmp_standby_state_nta)
+        standby_state_ntb = snmp_int(snmp_standby_state_ntb)
+        last_switch_reason = snmp_int(snmp_last_switch_reason)
+
+        if group_row_state == 1:
 #       protection-group is in-service
-            if int(snmp_admin_state.value) == 1 and int(snmp_group_row_state.value) == 1 and int(snmp_standby_state_nta.value) == 1 and int(snmp_standby_state_ntb.value) == 2:
-                print("ISAM NT-Redundancy is OK\nProtection Group %i\nAdmin Status: %s\nRow Status: %s\nNT-A Status: %s\nNT-B Status: %s\nLast Switchover Reason: %s" % (groupId,dict_admin_state[int(snmp_admin_state.value)],dict_group_row_state[int(snmp_group_row_state.value)],dict_standby_state[int(snmp_standby_state_nta.value)],dict_standby_state[int(snmp_standby_state_ntb.value)],dict_last_switch_reason[int(snmp_last_switch_reason.value)]))
-                print("| redundancy_status=0;1;2;0;3")
-                sys.exit(0)
+            if admin_state == 1 and group_row_state == 1 and standby_state_nta == 1 and standby_state_ntb == 2:
+                result.state,result.summary = 0,"ISAM NT-Redundancy is OK"
 
             else:
-                print("ISAM NT-Redundancy is CRITICAL\nProtection Group %i\nAdmin Status: %s\nRow Status: %s\nNT-A Status: %s\nNT-B Status: %s\nLast Switchover Reason: %s" % (groupId,dict_admin_state[int(snmp_admin_state.value)],dict_group_row_state[int(snmp_group_row_state.value)],dict_standby_state[int(snmp_standby_state_nta.value)],dict_standby_state[int(snmp_standby_state_ntb.value)],dict_last_switch_reason[int(snmp_last_switch_reason.value)]))
-                print("| redundancy_status=2;1;2;0;3")
-                sys.exit(2)
+                result.state,result.summary = 2,"ISAM NT-Redundancy is CRITICAL"
 
         else:
 #       protection-group is not in service
-            print("ISAM NT-Redundancy is WARNING\nProtection Group %i\nAdmin Status: %s\nRow Status: %s\nNT-A Status: %s\nNT-B Status: %s\nLast Switchover Reason: %s" % (groupId,dict_admin_state[int(snmp_admin_state.value)],dict_group_row_state[int(snmp_group_row_state.value)],dict_standby_state[int(snmp_standby_state_nta.value)],dict_standby_state[int(snmp_standby_state_ntb.value)],dict_last_switch_reason[int(snmp_last_switch_reason.value)]))
-            print("| redundancy_status=1;1;2;0;3")
-            sys.exit(1)
+            result.state,result.summary = 1,"ISAM NT-Redundancy is WARNING"
 
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
+        result.output.append("Protection Group %i\nAdmin Status: %s\nRow Status: %s\nNT-A Status: %s\nNT-B Status: %s\nLast Switchover Reason: %s" % (groupId,DICT_ADMIN_STATE.get(admin_state,"unknown"),DICT_GROUP_ROW_STATE.get(group_row_state,"unknown"),DICT_STANDBY_STATE.get(standby_state_nta,"unknown"),DICT_STANDBY_STATE.get(standby_state_ntb,"unknown"),DICT_LAST_SWITCH_REASON.get(last_switch_reason,"unknown")))
+        result.output += ["%s is not available" % oid for oid in snmp if snmp[oid] is None]
+        result.perfdata.append("redundancy_status=%i;1;2;0;3" % result.state)
+        result.metric("isam_nt_redundancy_group_row_state",group_row_state,group=str(groupId))
+        result.metric("isam_nt_standby_state",standby_state_nta,group=str(groupId),slot="nt-a")
+        result.metric("isam_nt_standby_state",standby_state_ntb,group=str(groupId),slot="nt-b")
+
+    return result
 
 
-def check_isam_power_supply(hostname,community,verbose):
+def check_isam_power_supply(session,verbose):
 #   checks the status of the power supplies (supported OSWP >= 6.6)
+#   the power supply table is folded row by row into state, output and perfdata
 
     oid_eqpt_ps_vin = "1.3.6.1.4.1.637.61.1.23.19.1.5"
     oid_eqpt_ps_iin = "1.3.6.1.4.1.637.61.1.23.19.1.6"
-    dict_eqpt_ps_name = {0:"BAT-A",1:"BAT-B"}
     oid_eqpt_ps_fault_vin = "1.3.6.1.4.1.637.61.1.23.19.1.10"
-    dict_eqpt_ps_fault_vin = {0:"no-error",1:"input-overvoltage-fault",2:"input-overvoltage-warning",3:"input-undervoltage-warning",4:"input-undervoltage-fault",5:"input-ac-nok-fault",6:"input-ac-nok-warning",7:"unit-off-for-insufficient-input-voltage"}
     oid_eqpt_ps_fault_iin = "1.3.6.1.4.1.637.61.1.23.19.1.12"
-    dict_eqpt_ps_fault_iin = {0:"no-error",1:"input-overcurrent-fault",2:"input-overcurrent-warning",3:"input-overpower-warning"}
     oid_eqpt_ps_fault_temp = "1.3.6.1.4.1.637.61.1.23.19.1.14"
-    dict_eqpt_ps_fault_temp = {0:"no-error",1:"overtemperature-fault",2:"overtemperature-warning",3:"undertemperature-warning",4:"undertemperature-fault"}
     oid_eqpt_ps_fault_cml = "1.3.6.1.4.1.637.61.1.23.19.1.15"
-    dict_eqpt_ps_fault_cml = {0:"no-error",1:"invalid-or-unsupported-command-received",2:"invalid-or-unsupported-data-received",3:"packet-error-check-failed",4:"memory-fault-detected",5:"processor-fault-detected",6:"other-communication-fault",7:"other-memory-or-logic-fault"}
     oid_eqpt_ps_present = "1.3.6.1.4.1.637.61.1.23.19.1.16"
-    dict_eqpt_ps_present = {0:"yes",1:"no"}
     oid_eqpt_ps_fault_detected = "1.3.6.1.4.1.637.61.1.23.19.1.17"
-    dict_eqpt_ps_fault_detected = {0:"no",1:"yes"}
-    code_critical = [0,0]
-
-    snmp_eqpt_ps_vin = snmp_walk(oid_eqpt_ps_vin,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_iin = snmp_walk(oid_eqpt_ps_iin,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_fault_detected = snmp_walk(oid_eqpt_ps_fault_detected,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_present = snmp_walk(oid_eqpt_ps_present,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_fault_vin = snmp_walk(oid_eqpt_ps_fault_vin,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_fault_iin = snmp_walk(oid_eqpt_ps_fault_iin,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_fault_temp = snmp_walk(oid_eqpt_ps_fault_temp,hostname=hostname,community=community,version=2,timeout=10,retries=0)
-    snmp_eqpt_ps_fault_cml = snmp_walk(oid_eqpt_ps_fault_cml,hostname=hostname,community=community,version=2,timeout=10,retries=0)
+    code_critical = 0
+    supplies = 0
+    result = CheckResult("power_supply")
 
-    if snmp_eqpt_ps_vin and snmp_eqpt_ps_fault_detected and snmp_eqpt_ps_present and snmp_eqpt_ps_fault_vin and snmp_eqpt_ps_fault_iin and snmp_eqpt_ps_fault_temp and snmp_eqpt_ps_fault_cml:
+    for row in session.stream_rows([("vin",oid_eqpt_ps_vin,int),("iin",oid_eqpt_ps_iin,int),("fault_detected",oid_eqpt_ps_fault_detected,int),("present",oid_eqpt_ps_present,int),("fault_vin",oid_eqpt_ps_fault_vin,int),("fault_iin",oid_eqpt_ps_fault_iin,int),("fault_temp",oid_eqpt_ps_fault_temp,int),("fault_cml",oid_eqpt_ps_fault_cml,int)]):
+        if verbose:
+            if not supplies: print("\nSNMP - power supply table:")
+            print("%s" % row)
+        name = DICT_EQPT_PS_NAME.get(supplies,"PS-%i" % supplies)
+        supplies += 1
 
 #      check if BAT-A or BAT-B reports 0 volts or other faults are present
-        i = 0
-        while(i < len(snmp_eqpt_ps_vin)):
-            if int(snmp_eqpt_ps_vin[i].value) == 0 or snmp_eqpt_ps_fault_detected[i].value == 1:
-                code_critical[i] = 2
-
-                if verbose:
-                    print("\nSNMP - eqpt_ps_vin:")
-                    for item in snmp_eqpt_ps_vin: print("%s" % item)
-                    print("\nSNMP - eqpt_ps_fault_detected: yes")
-                    for item in snmp_eqpt_ps_fault_detected: print("%s" % item)
-                    print("\nSNMP - eqpt_ps_fault_vin:")
-                    for item in snmp_eqpt_ps_fault_vin: print("%s" % item)
-                    print("\nSNMP - eqpt_ps_fault_iin:")
-                    for item in snmp_eqpt_ps_fault_iin: print("%s" % item)
-                    print("\nSNMP - eqpt_ps_fault_temp:")
-                    for item in snmp_eqpt_ps_fault_temp: print("%s" % item)
-                    print("\nSNMP - eqpt_ps_fault_cml:")
-                    for item in snmp_eqpt_ps_fault_cml: print("%s" % item)
-            i += 1
-
-#       print plugin-output and generate performance-data
-        if any(code_critical):
-            print("ISAM Power Supply is CRITICAL\n")
-
-        else:
-            print("ISAM Power Supply is OK\n")
-
-#       print plugin-output
-        i = 0
-        while(i < len(snmp_eqpt_ps_vin)):
-            print("%s:\nVoltage:%.2fV\nCurrent:%.2fA" % (dict_eqpt_ps_name[i],float(snmp_eqpt_ps_vin[i].value)/1000,float(snmp_eqpt_ps_iin[i].value)/1000))
-            print("PS present: %s" % dict_eqpt_ps_present[int(snmp_eqpt_ps_present[i].value)])
-            print("PS Fault detected: %s\n" % dict_eqpt_ps_fault_detected[int(snmp_eqpt_ps_fault_detected[i].value)])
-            print("PS Fault Vin: %s" % dict_eqpt_ps_fault_vin[int(snmp_eqpt_ps_fault_vin[i].value)])
-            print("PS Fault Iin: %s" % dict_eqpt_ps_fault_iin[int(snmp_eqpt_ps_fault_iin[i].value)])
-            print("PS Fault Temp: %s" % dict_eqpt_ps_fault_temp[int(snmp_eqpt_ps_fault_temp[i].value)])
-            print("PS Fault CML: %s\n" % dict_eqpt_ps_fault_cml[int(snmp_eqpt_ps_fault_cml[i].value)])
-            i += 1
-
-        print(" | ")
+#      a missing voltage is treated like 0 volts
+        state = 2 if not row.vin or row.fault_detected == 1 else 0
+        if state: code_critical += 1
+
+        result.output.append("%s:\nVoltage:%.2fV\nCurrent:%.2fA" % (name,float(row.vin or 0)/1000,float(row.iin or 0)/1000))
+        result.output.append("PS present: %s" % DICT_EQPT_PS_PRESENT.get(row.present,"unknown"))
+        result.output.append("PS Fault detected: %s\n" % DICT_EQPT_PS_FAULT_DETECTED.get(row.fault_detected,"unknown"))
+        result.output.append("PS Fault Vin: %s" % DICT_EQPT_PS_FAULT_VIN.get(row.fault_vin,"unknown"))
+        result.output.append("PS Fault Iin: %s" % DICT_EQPT_PS_FAULT_IIN.get(row.fault_iin,"unknown"))
+        result.output.append("PS Fault Temp: %s" % DICT_EQPT_PS_FAULT_TEMP.get(row.fault_temp,"unknown"))
+        result.output.append("PS Fault CML: %s\n" % DICT_EQPT_PS_FAULT_CML.get(row.fault_cml,"unknown"))
 
 #       generate performance data
-        i = 0
-        while(i < len(snmp_eqpt_ps_vin)):
-            print("%s_state=%i;1;2;0;3" % (dict_eqpt_ps_name[i].lower(),code_critical[i]))
-            print("%s_voltage=%.2fvolts;;;0;60" % (dict_eqpt_ps_name[i].lower(),float(snmp_eqpt_ps_vin[i].value)/1000))
-            print("%s_current=%.2fampere;;;0;10" % (dict_eqpt_ps_name[i].lower(),float(snmp_eqpt_ps_iin[i].value)/1000))
-            i += 1
-
-        if any(code_critical): sys.exit(2)
-        else: sys.exit(0)
-
-    else:
-        print("UNKNOWN - An SNMP error occured")
-        sys.exit(3)
+        result.perfdata.append("%s_state=%i;1;2;0;3" % (name.lower(),state))
+        result.perfdata.append("%s_voltage=%.2fvolts;;;0;60" % (name.lower(),float(row.vin or 0)/1000))
+        result.perfdata.append("%s_current=%.2fampere;;;0;10" % (name.lower(),float(row.iin or 0)/1000))
+        result.metric("isam_power_supply_state",state,supply=name.lower())
+        result.metric("isam_power_supply_volts",float(row.vin or 0)/1000,supply=name.lower())
+        result.metric("isam_power_supply_amperes",float(row.iin or 0)/1000,supply=name.lower())
+
+    if supplies:
+#       plugin-output, the supplies follow the summary after an empty line
+        if code_critical: result.state,result.summary = 2,"ISAM Power Supply is CRITICAL"
+        else: result.state,result.summary = 0,"ISAM Power Supply is OK"
+        result.output.insert(0,"")
+
+    return result
+
+
+def check_isam_ont_optics(session,warning,critical,pon_critical,top,oid_rx,oid_tx,verbose):
+#   checks the rx optical level of all ONTs
+#   the table is streamed, only per PON aggregates and the top worst ONTs (heap) are kept, so memory does not grow with the ONTs
+#   an ONT at or below the warning/critical level (dBm) is WARNING/CRITICAL, a PON with pon_critical or more such ONTs is CRITICAL
+
+    import heapq
+    result = CheckResult("ont_optics")
+    worst = []
+    pons = {}
+    onts = 0
+    code_warning = 0
+    code_critical = 0
+
+    for row in session.stream_rows([("rx",oid_rx,int),("tx",oid_tx,int)]):
+        if row.rx is None: continue
+        onts += 1
+        rx = row.rx/ONT_LEVEL_SCALE
+        tx = row.tx/ONT_LEVEL_SCALE if row.tx is not None else None
+
+#       per PON: ONTs, sum of rx, lowest rx, ONTs at or below the warning level
+        pon = pon_port(row.index[0])
+        aggregate = pons.get(pon)
+        if aggregate is None: aggregate = pons[pon] = [0,0.0,rx,0]
+        aggregate[0] += 1
+        aggregate[1] += rx
+        aggregate[2] = min(aggregate[2],rx)
+        if rx <= critical: code_critical += 1
+        elif rx <= warning: code_warning += 1
+        if rx <= warning: aggregate[3] += 1
+
+#       the heap keeps the top lowest rx levels, its root is the highest of them, top 0 lists no ONTs
+        if len(worst) < top: heapq.heappush(worst,(-rx,row.index[0],tx))
+        elif worst and -rx > worst[0][0]: heapq.heappushpop(worst,(-rx,row.index[0],tx))
+
+    if onts:
+        if verbose: print("\nSNMP - ONT optics table: %i ONTs on %i PONs" % (onts,len(pons)))
+        low_pons = sorted(pon for pon,aggregate in pons.items() if aggregate[3] >= pon_critical)
+
+#       plugin-output
+        if code_critical or low_pons: result.state,result.summary = 2,"%i/%i ONTs are reporting CRITICAL, %i PONs with %i or more low ONTs" % (code_critical,onts,len(low_pons),pon_critical)
+        elif code_warning: result.state,result.summary = 1,"%i/%i ONTs are reporting WARNING" % (code_warning,onts)
+        else: result.state,result.summary = 0,"%i/%i ONTs are reporting OK" % (onts,onts)
+        result.output.append("")
+
+        for pon in low_pons:
+            result.output.append("pon:%i/%i/%i/%i: %i/%i ONTs at or below %.1f dBm" % (pon + (pons[pon][3],pons[pon][0],warning)))
+        for rx,ifindex,tx in sorted(worst,key=lambda ont: (-ont[0],ont[1])):
+            result.output.append("ont:%i/%i/%i/%i/%i: rx %.2f dBm, tx %s" % (pon_port(ifindex) + (ifindex & 0xff,-rx,"%.2f dBm" % tx if tx is not None else "unknown")))
+
+#       performance-data and metrics per PON
+        for pon,(count,total,lowest,low) in sorted(pons.items()):
+            name = "%i/%i/%i/%i" % pon
+            result.perfdata.append("ont_%s_rx_min=%.2fdBm;%g:;%g:;;" % (name,lowest,warning,critical))
+            result.perfdata.append("ont_%s_rx_mean=%.2fdBm;;;;" % (name,total/count))
+            result.perfdata.append("ont_%s_low=%i;;%i;0;%i" % (name,low,pon_critical-1,count))
+            result.metric("isam_pon_onts",count,pon=name)
+            result.metric("isam_pon_ont_rx_min_dbm",lowest,pon=name)
+            result.metric("isam_pon_ont_rx_mean_dbm",total/count,pon=name)
+            result.metric("isam_pon_onts_low",low,pon=name)
+
+    return result
+
+
+def state_file(state_dir,hostname):
+#   path of the state store of one host
+
+    return os.path.join(state_dir,"%s.json" % hostname.replace(os.sep,"_"))
+
+
+def load_state(path):
+#   returns the stored state of a host, an empty state if there is none or it can not be read
+
+    import json
+    try:
+        with open(path) as f: return json.load(f)
+    except (OSError,ValueError):
+        return {}
+
+
+def save_state(path,state,mode=None):
+#   written to a temporary file and renamed, so a concurrent reader never sees a partial file
+#   with mode the file is created with these permissions
+
+    import json
+    import threading
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    tmp = "%s.%i.%i.tmp" % (path,os.getpid(),threading.get_ident())
+    with open(os.open(tmp,os.O_WRONLY | os.O_CREAT | os.O_TRUNC,mode if mode is not None else 0o666),"w") as f: json.dump(state,f)
+    os.replace(tmp,path)
+
+
+class PonHistory(object):
+#   rx/tx utilization of the PONs of one host over its last polls, a ring buffer of float32 values in a memory-mapped file
+#   the file is the header, the ifIndexes of capacity PONs and slots rows of capacity rx/tx pairs, one row per poll
+#   values of PONs missing in a poll are NaN, a row belongs to the history once the poll count in the header is increased (commit)
+#   rows are cleared when their poll starts and never read before, so a new file stays sparse
+#   the file is locked while it is open, a check of the same host in another process waits for it
+#   a full PON directory is doubled in place, a file with another number of slots is started again
+
+    def __init__(self,path,slots,capacity=64):
+        import fcntl
+        import struct
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        self.file = open(path,"a+b")
+        fcntl.flock(self.file,fcntl.LOCK_EX)
+        self.file.seek(0)
+        header = self.file.read(struct.calcsize(PON_HISTORY_HEADER))
+        self.slots = slots
+        self.polls = 0
+        if len(header) == struct.calcsize(PON_HISTORY_HEADER):
+            magic,found_slots,found_capacity,polls = struct.unpack(PON_HISTORY_HEADER,header)
+            if magic == PON_HISTORY_MAGIC and found_slots == slots and os.fstat(self.file.fileno()).st_size == self.size(found_capacity):
+                capacity,self.polls = found_capacity,polls
+        if not self.polls: self.file.truncate(0)
+        self.map_file(capacity)
+        self.columns = dict((ifindex,column) for column,ifindex in enumerate(self.ifindexes) if ifindex)
+#       the row of this poll still holds the poll of one ring buffer ago
+        self.row = self.polls % self.slots
+        self.clear(self.row*2*self.capacity,(self.row+1)*2*self.capacity)
+
+    def size(self,capacity):
+        import struct
+        return struct.calcsize(PON_HISTORY_HEADER) + capacity*4 + self.slots*capacity*8
+
+    def map_file(self,capacity):
+#       maps the file with a directory of capacity PONs
+        import mmap
+        import struct
+        self.file.truncate(self.size(capacity))
+        self.capacity = capacity
+        self.map = mmap.mmap(self.file.fileno(),0)
+        offset = struct.calcsize(PON_HISTORY_HEADER)
+        self.ifindexes = memoryview(self.map)[offset:offset + capacity*4].cast("I")
+        self.values = memoryview(self.map)[offset + capacity*4:].cast("f")
+        self.write_header()
+
+    def unmap_file(self):
+        self.ifindexes.release()
+        self.values.release()
+        self.map.close()
+
+    def write_header(self):
+        import struct
+        struct.pack_into(PON_HISTORY_HEADER,self.map,0,PON_HISTORY_MAGIC,self.slots,self.capacity,self.polls)
+
+    def clear(self,start,end):
+#       sets values start to end to NaN
+        from array import array
+        self.values[start:end] = array("f",[float("nan")])*(end - start)
+
+    def grow(self):
+#       doubles the PON directory, rows are moved from the last to the first, so no row is overwritten before it was moved
+#       the new columns of the rows written so far are NaN
+        old = self.capacity
+        ifindexes = self.ifindexes.tobytes()
+        self.unmap_file()
+        self.map_file(old*2)
+        offset = len(self.map) - self.slots*self.capacity*8
+        old_offset = offset - old*4
+        for row in reversed(range(min(self.polls + 1,self.slots))):
+            self.map.move(offset + row*self.capacity*8,old_offset + row*old*8,old*8)
+            self.clear(row*2*self.capacity + 2*old,(row+1)*2*self.capacity)
+        self.ifindexes[:old] = memoryview(ifindexes).cast("I")
+        self.ifindexes[old:] = memoryview(bytes(old*4)).cast("I")
+
+    def add(self,ifindex,rx,tx):
+#       values of one PON in the row of this poll, a new PON gets the next free column of the directory
+        column = self.columns.get(ifindex)
+        if column is None:
+            if len(self.columns) == self.capacity: self.grow()
+            column = self.columns[ifindex] = len(self.columns)
+            self.ifindexes[column] = ifindex
+        position = self.row*2*self.capacity + 2*column
+        self.values[position] = rx
+        self.values[position+1] = tx
+
+    def window(self,ifindex,polls,statistic):
+#       (rx, tx) statistic of a PON over this poll and the polls before it, only the rows of the window are read
+#       the column of the PON is a strided slice of the rows, split in two where the window wraps around the ring buffer
+        column = self.columns[ifindex]
+        width = 2*self.capacity
+        polls = min(polls,self.polls + 1,self.slots)
+        first = (self.polls - polls + 1) % self.slots
+        ranges = [(first,self.row)] if first <= self.row else [(first,self.slots - 1),(0,self.row)]
+        stats = []
+        for direction in (0,1):
+            values = []
+            for start,end in ranges: values += self.values[start*width + 2*column + direction:end*width + 2*column + direction + 1:width].tolist()
+            stats.append(window_statistic(values,statistic))
+        return stats
+
+    def commit(self):
+#       makes the row of this poll part of the history
+        self.polls += 1
+        self.write_header()
+
+    def close(self):
+        self.unmap_file()
+        self.file.close()
+
+
+def window_statistic(values,statistic):
+#   mean or 95th percentile (nearest rank) of the values of a window, NaN of PONs missing in a poll are left out
+
+    values = sorted(value for value in values if value == value)
+    if statistic == "mean": return sum(values)/len(values)
+    return values[-(-len(values)*95//100) - 1]
+
+
+def open_pon_history(hostname,params):
+#   history of the PON utilization of a host, None unless --pon-window is given
+
+    if not params.get("history_dir"): return None
+    path = os.path.join(params["history_dir"],"%s.pon" % hostname.replace(os.sep,"_"))
+    return PonHistory(path,params["pon_history"])
+
+
+def change_indicator(session,change_oid):
+#   sysUpTime and the change counter/timestamp of the device in one request
+#   returns None if the device does not provide the change oid
+
+    values = session.get_many([OID_SYS_UPTIME,change_oid])
+    if values[OID_SYS_UPTIME] is None or values[change_oid] is None: return None
+    return [int(values[OID_SYS_UPTIME].value),values[change_oid].value]
+
+
+def unchanged(entry,indicator,max_age):
+#   true if a stored entry is younger than max_age and the change indicator did not move since it was stored
+#   a lower sysUpTime means the device rebooted and the change timestamp may have been reset
+
+    if not entry or indicator is None or entry["indicator"] is None: return False
+    if indicator[1] != entry["indicator"][1] or indicator[0] < entry["indicator"][0]: return False
+    return time.time() - entry["time"] < max_age
+
+
+def stored_result(entry,indicator,max_age):
+#   returns the stored result of a check if the change indicator did not move since it was polled
+
+    if not unchanged(entry,indicator,max_age): return None
+    return parse_nagios_output(entry["name"],entry["state"],entry["text"])
+
+
+def slot_name(index):
+#   slot name of a board table index like the CLI shows it, None for indexes which are no board slot (e.g. 4481)
+#   the NTs of the first shelf are nt-a and nt-b, on other shelves the rack and shelf are added
+
+    rack,shelf,position = index >> 12 & 0xf,index >> 8 & 0xf,index & 0xff
+    if position == SLOT_ACU: return "acu:%i/%i" % (rack,shelf)
+    if position in SLOT_NT: return SLOT_NT[position] if (rack,shelf) == (1,1) else "%s:%i/%i" % (SLOT_NT[position],rack,shelf)
+    if position - 2 in SLOT_LT: return "lt:%i/%i/%i" % (rack,shelf,position - 2)
+    if position - 2 in SLOT_VLT: return "vlt:%i/%i/%i" % (rack,shelf,position - 2)
+    return None
+
+
+def discover_slots(session):
+#   slot index -> name of every board slot of the device, from the index of the board table
+#   the actual type column is shared with the board checks, so a run with them costs no extra request
+
+    slots = {}
+    for item in session.table(OID_BOARD_TABLE[:1])[OID_BOARD_TABLE[0]]:
+        index = int(full_oid(item).rsplit(".",1)[-1])
+        if slot_name(index): slots[index] = slot_name(index)
+    return slots
+
+
+def load_slot_mapping(session,params,indicator=None):
+#   slot mapping of a host: given in params, from the state store (slot_dir, --slot-cache) or discovered
+#   the stored mapping is used until it is older than slot_max_age or the change indicator of the device moved
+#   a device without change indicator keeps its mapping for slot_max_age and is not asked for the indicator again until then
+
+    if params.get("slot_mapping"): return params["slot_mapping"]
+    if not params.get("slot_dir") or params.get("slot_max_age",0) <= 0: return discover_slots(session)
+    path = state_file(params["slot_dir"],session.hostname)
+    entry = load_state(path).get("slot_mapping")
+    if entry and entry["indicator"] is None and time.time() - entry["time"] < params["slot_max_age"]:
+        return dict((int(index),name) for index,name in entry["slots"].items())
+    if indicator is None:
+        try:
+            indicator = change_indicator(session,params["change_oid"])
+        except Exception:
+            indicator = None
+    if unchanged(entry,indicator,params["slot_max_age"]):
+        return dict((int(index),name) for index,name in entry["slots"].items())
+    slots = discover_slots(session)
+    if slots and not session.expired:
+        entries = load_state(path)
+        entries["slot_mapping"] = {"slots":slots,"indicator":indicator,"time":time.time()}
+        try:
+            save_state(path,entries)
+        except OSError as e:
+            if params["verbose"]: print("\nSlot mapping not stored in %s: %s" % (path,e))
+    return slots
+
+
+def process_startup():
+#   seconds from the start of the process until now, read from /proc (Linux only)
+
+    try:
+        starttime = int(open("/proc/self/stat").read().rsplit(")",1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        return float(open("/proc/uptime").read().split()[0]) - starttime
+    except (OSError,ValueError,IndexError):
+        return None
+
+
+def timing_perfdata(session,mark,startup):
+#   perfdata of runtime, startup, PDUs, rows and the duration per oid since the session snapshot mark
+
+    started,pdus,rows,timings = mark
+    perfdata = ["runtime=%.4fs;;;0;" % (time.perf_counter() - started)]
+    if startup is not None: perfdata.append("startup=%.3fs;;;0;" % startup)
+    perfdata.append("pdus=%i;;;0;" % (session.pdus - pdus))
+    perfdata.append("rows=%i;;;0;" % (session.rows_fetched - rows))
+    for oid in sorted(session.timings):
+        if session.timings[oid] > timings.get(oid,0): perfdata.append("'snmp %s'=%.4fs;;;0;" % (oid,session.timings[oid] - timings.get(oid,0)))
+    return perfdata
+
+
+def start_profile():
+#   cProfile and tracemalloc for --profile, both are only imported when used
+
+    import cProfile
+    import tracemalloc
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def print_profile(profiler,limit=25):
+#   prints the functions with the highest cumulative time and the biggest allocations to stderr
+
+    profiler.disable()
+    import pstats
+    import tracemalloc
+    snapshot = tracemalloc.take_snapshot()
+    current,peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sys.stderr.write("\nProfile - cumulative time:\n")
+    pstats.Stats(profiler,stream=sys.stderr).sort_stats("cumulative").print_stats(limit)
+    sys.stderr.write("Profile - memory: current %.1f KiB, peak %.1f KiB\n" % (current/1024.0,peak/1024.0))
+    for stat in snapshot.statistics("lineno")[:limit//2]: sys.stderr.write("%s\n" % stat)
+
+
+def run_isam_check(session,name,params):
+#   run one check by name with the parameters from the command line
+#   errors end up in an UNKNOWN result, so one failing check does not stop the others
+
+    verbose = params["verbose"]
+    try:
+        if name == "board_availability": return check_isam_board_availability(session,params["slot_mapping"],verbose)
+        if name == "board_oper_status": return check_isam_board_operational_status(session,params["slot_mapping"],verbose)
+        if name == "auto_backup_status": return check_isam_auto_backup_status(session,verbose)
+        if name == "pon_utilization":
+            history = open_pon_history(session.hostname,params)
+            try:
+                return check_isam_pon_utilization(session,params["warning"],params["critical"],verbose,history,params["pon_window"],params["pon_statistic"])
+            finally:
+                if history is not None: history.close()
+        if name == "board_temperature": return check_isam_board_temperature(session,params["slot_mapping"],verbose)
+        if name == "nt_redundancy": return check_isam_nt_redundancy(session,params["groupId"],verbose)
+        if name == "power_supply": return check_isam_power_supply(session,verbose)
+        if name == "ont_optics": return check_isam_ont_optics(session,params["ont_warning"],params["ont_critical"],params["ont_pon_critical"],params["ont_top"],params["ont_rx_oid"],params["ont_tx_oid"],verbose)
+    except Exception as e:
+        result = CheckResult(name,3,"UNKNOWN - An error occured")
+        result.output.append("%s" % e)
+        return result
+
+
+def deadline_result(result,budget):
+#   a check which ran out of its budget is UNKNOWN, the output keeps what was fetched before
+
+    if result.state != 3: result.summary = "UNKNOWN - Deadline of %gs exceeded, partial data: %s" % (budget,result.summary)
+    else: result.summary = "UNKNOWN - Deadline of %gs exceeded" % budget
+    result.state = 3
+
+
+def run_isam_checks(session,names,params):
+#   run several checks against one host over the same session
+#   the board table is used by two checks, so it is fetched once in a single stream
+#   in conditional mode the board checks are answered from the state store while the change indicator does not move
+#   with a deadline every polled check gets its own budget, the first one shares it with the requests of all checks
+
+    session.start_deadline()
+    conditional = [name for name in names if name in CONDITIONAL_CHECKS] if params.get("state_dir") else []
+    stored = {}
+    indicator = None
+    if conditional:
+        path = state_file(params["state_dir"],session.hostname)
+        try:
+            indicator = change_indicator(session,params["change_oid"])
+        except Exception:
+            indicator = None
+        entries = load_state(path)
+        for name in conditional:
+            result = stored_result(entries.get(name),indicator,params["state_max_age"])
+            if result: stored[name] = result
+        if params["verbose"]: print("\nChange indicator: %s - answered from state: %s" % (indicator,", ".join(stored) or "none"))
+
+#   with --timing every check gets the cost since the previous one, the shared board table is accounted to the first check
+    mark = session.snapshot()
+    if len([name for name in names if name in CONDITIONAL_CHECKS and name not in stored]) > 1:
+        session.table(OID_BOARD_TABLE)
+#   the slot mapping is looked up once for all checks which name boards
+    if [name for name in names if name in SLOT_CHECKS and name not in stored]:
+        params = dict(params,slot_mapping=load_slot_mapping(session,params,indicator))
+    results = []
+    timings = {}
+    first = True
+    for name in names:
+        result = stored.get(name)
+        if not result:
+            if not first: session.start_deadline()
+            first = False
+            result = run_isam_check(session,name,params)
+            if session.expired: deadline_result(result,session.budget)
+        results.append(result)
+        if params.get("timing"):
+            timings[name] = timing_perfdata(session,mark,params.get("startup"))
+            mark = session.snapshot()
+
+#   polled results are stored with the indicator they were polled at, UNKNOWN results are not kept
+    polled = [result for result in results if result.name in conditional and result.name not in stored and result.state != 3]
+    if polled:
+        entries = load_state(path)
+        for result in polled:
+            entries[result.name] = {"name":result.name,"state":result.state,"text":result.nagios(),"indicator":indicator,"time":time.time()}
+        try:
+            save_state(path,entries)
+        except OSError as e:
+            if params["verbose"]: print("\nState store %s not written: %s" % (path,e))
+
+#   timing is added after storing, so a stored result never carries the timing of an earlier run
+    for result in results: result.perfdata += timings.get(result.name,[])
+    return results
+
+
+def check_arguments(name,options):
+#   returns an error message if the arguments of a check are missing or invalid
+
+    if not (options.hostname and (options.community or getattr(options,"user",None))): return "Please check your arguments!"
+    if getattr(options,"user",None) and [password for password in (getattr(options,"auth_password",None),getattr(options,"priv_password",None)) if password is not None and len(password) < 8]:
+        return "SNMPv3 passwords need at least 8 characters!"
+    if getattr(options,"priv_password",None) and not options.auth_password: return "Please check your arguments!"
+    if name == "pon_utilization":
+        if not (options.warning and options.critical): return "Please check your arguments!"
+        if not (1 <= int(options.warning) <= 99 and 2 <= int(options.critical) <= 100 and int(options.warning) < int(options.critical)): return "Thresholds are not acceptable!"
+    if name == "nt_redundancy":
+        if not options.groupId: return "Please check your arguments!"
+        if not 1 <= int(options.groupId) <= 5: return "Thresholds are not acceptable!"
+    if name == "ont_optics":
+        if options.ont_warning is None or options.ont_critical is None: return "Please check your arguments!"
+        if not float(options.ont_critical) < float(options.ont_warning) < 0: return "Thresholds are not acceptable!"
+        if int(options.ont_top) < 0: return "Thresholds are not acceptable!"
+    return None
+
+
+def select_checks(host):
+#   checks of an inventory host: the configured ones or all checks which got their arguments
+
+    if host.checks: return [name for name,description in ISAM_CHECKS if name in host.checks]
+    return [name for name,description in ISAM_CHECKS if not check_arguments(name,host)]
+
+
+def check_params(options,base):
+#   parameters for run_isam_check from command line options or an inventory host
+
+    params = dict(base)
+    params["warning"] = int(options.warning or 0)
+    params["critical"] = int(options.critical or 0)
+    params["groupId"] = int(options.groupId or 0)
+    params["ont_warning"] = float(options.ont_warning or 0)
+    params["ont_critical"] = float(options.ont_critical or 0)
+    return params
+
+
+def read_inventory(path,user=None):
+#   reads the host inventory, one host per line:
+#   <host> <community> [checks=board_availability,...] [warning=80] [critical=85] [group=1] [ont_warning=-25] [ont_critical=-28] [interval=300]
+#   with the user of SNMPv3 (-u, used for all hosts) the community is not used and may be left out
+#   empty lines and everything after a # are ignored
+
+    from optparse import Values
+    hosts = []
+    lineno = 0
+    for line in open(path):
+        lineno += 1
+        fields = line.split("#",1)[0].split()
+        if not fields: continue
+        if user and (len(fields) < 2 or "=" in fields[1]): fields.insert(1,None)
+        if len(fields) < 2: raise ValueError("%s:%i: host and community are required" % (path,lineno))
+        host = Values({"hostname":fields[0],"community":fields[1],"user":user,"checks":None,"warning":None,"critical":None,"groupId":None,"ont_warning":None,"ont_critical":None,"interval":None})
+        for field in fields[2:]:
+            if "=" not in field: raise ValueError("%s:%i: invalid field '%s'" % (path,lineno,field))
+            key,value = field.split("=",1)
+            if key == "group": key = "groupId"
+            if key == "checks": value = value.split(",")
+            if key == "user" or not hasattr(host,key): raise ValueError("%s:%i: unknown key '%s'" % (path,lineno,key))
+            setattr(host,key,value)
+        hosts.append(host)
+    return hosts
+
+
+def poll_host(host,base_params,session_options,recorder=None):
+#   runs the checks of one inventory host over one session
+#   if the session can not be opened every check of the host gets an UNKNOWN result
+#   with a recorder (SnmpSnapshot) the fetched varbinds are kept in it
+
+    names = select_checks(host)
+    params = check_params(host,base_params)
+    try:
+        session = IsamSession(host.hostname,host.community,**session_options)
+    except Exception as e:
+        results = []
+        for name in names:
+            result = CheckResult(name,3,"UNKNOWN - An error occured")
+            result.output.append("%s" % e)
+            results.append(result)
+        return results
+    session.recorder = recorder
+    results = run_isam_checks(session,names,params)
+    session.close()
+    return results
+
+
+def poll_fleet(hosts,base_params,session_options,workers=32,host_concurrency=1,recorders=None):
+#   polls many hosts concurrently with a bounded pool of worker threads
+#   yields (host, results) as soon as a host is finished, so the total time follows the slowest device
+#   inventory entries of the same device share a semaphore which limits the parallel sessions to it
+#   recorders are SnmpSnapshots by hostname which record the polls, see poll_host
+
+    import threading
+    from concurrent.futures import ThreadPoolExecutor,as_completed
+    limits = {}
+    for host in hosts:
+        if host.hostname not in limits: limits[host.hostname] = threading.BoundedSemaphore(host_concurrency)
+
+    def poll(host):
+        with limits[host.hostname]:
+            return poll_host(host,base_params,session_options,(recorders or {}).get(host.hostname))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = dict((pool.submit(poll,host),host) for host in hosts)
+        for future in as_completed(futures):
+            yield futures[future],future.result()
+
+
+class NagiosCommandWriter(object):
+#   submits results as passive service checks (PROCESS_SERVICE_CHECK_RESULT) to the external command file of Nagios or Icinga
+#   the command file is a FIFO: a write of at most PIPE_BUF bytes is never mixed with the writes of other processes,
+#   so the lines are collected and written in blocks up to that size, a single longer line is written on its own
+
+    def __init__(self,path):
+        import select
+        self.fd = os.open(path,os.O_WRONLY | os.O_APPEND)
+        self.limit = select.PIPE_BUF
+        self.block = []
+        self.size = 0
+        self.results = 0
+
+    def add(self,hostname,results):
+        for result in results:
+            line = ("[%i] PROCESS_SERVICE_CHECK_RESULT;%s;%s;%i;%s\n" % (time.time(),hostname,dict(ISAM_CHECKS)[result.name],result.state,result.passive())).encode("utf-8")
+            if self.size + len(line) > self.limit: self.flush()
+            self.block.append(line)
+            self.size += len(line)
+            self.results += 1
+
+    def flush(self):
+        data = b"".join(self.block)
+        while data: data = data[os.write(self.fd,data):]
+        self.block,self.size = [],0
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+
+class CheckmkSpoolWriter(object):
+#   writes the results of every host as piggyback data into a file of the Check_MK agent spool directory
+#   the file is written under a hidden temporary name and renamed, the agent skips hidden files, so it never reads half of it
+#   with max_age the name starts with it and the agent drops the file when it is older
+
+    def __init__(self,path,max_age=0):
+        self.path = path
+        self.prefix = "%i_" % max_age if max_age else ""
+        self.results = 0
+
+    def add(self,hostname,results):
+        lines = ["<<<<%s>>>>" % hostname,"<<<local>>>"] + [result.local() for result in results] + ["<<<<>>>>",""]
+        name = "%scheck_isam_%s" % (self.prefix,hostname.replace(os.sep,"_"))
+        temp = os.path.join(self.path,".%s.tmp" % name)
+        try:
+            with open(temp,"w") as f: f.write("\n".join(lines))
+            os.rename(temp,os.path.join(self.path,name))
+        except Exception:
+            if os.path.exists(temp): os.unlink(temp)
+            raise
+        self.results += len(results)
+
+    def close(self):
+        pass
+
+
+class IsamPoller(object):
+#   polls all hosts of the inventory on a schedule and keeps the latest results in memory
+#   results are stored as (timestamp, state, nagios output) per host and check
+#   with traps the varbinds of every poll are kept per host (SnmpSnapshot), a trap re-polls only the rows it names
+#   and the affected checks are evaluated again from the snapshot, so the poll interval can be long
+#   the schedule is kept by address and port of the hosts (host_port), not by their inventory settings
+
+    def __init__(self,hosts,base_params,session_options,interval,fleet_options,traps=False):
+        import queue
+        import threading
+        self.hosts = hosts
+        self.base_params = base_params
+        self.session_options = session_options
+        self.interval = interval
+        self.fleet_options = fleet_options
+        self.traps = traps
+        self.results = {}
+        self.snapshots = {}
+        self.due = dict((host_port(host.hostname),0) for host in hosts)
+        self.wake = threading.Event()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+
+    def store(self,host,results):
+        with self.lock:
+            for result in results:
+                self.results[(host.hostname,result.name)] = (time.time(),result.state,result.nagios())
+
+    def run(self):
+#       poll all hosts which are due concurrently, then sleep until the next host is due or a trap asks for a poll
+#       without hosts (empty inventory) nothing is ever due, the loop sleeps until it is woken
+        while True:
+            now = time.time()
+            hosts = [host for host in self.hosts if self.due[host_port(host.hostname)] <= now]
+            recorders = dict((host.hostname,SnmpSnapshot()) for host in hosts) if self.traps else None
+            for host,results in poll_fleet(hosts,self.base_params,self.session_options,recorders=recorders,**self.fleet_options):
+                self.store(host,results)
+#           a host which could not be polled keeps the snapshot of its last poll
+                if recorders and len(recorders[host.hostname]):
+                    with self.lock: self.snapshots[host.hostname] = recorders[host.hostname]
+            for host in hosts: self.due[host_port(host.hostname)] = now + int(host.interval or self.interval)
+            self.wake.clear()
+            self.wake.wait(max(1,min(self.due.values()) - time.time()) if self.due else None)
+
+    def lookup(self,hostname,name):
+        with self.lock:
+            return self.results.get((hostname,name))
+
+    def repoll(self,host):
+#       the host is polled completely in the next round of run
+        self.due[host_port(host.hostname)] = 0
+        self.wake.set()
+
+    def run_traps(self):
+#       evaluates the traps queued by the trap receiver, traps of a host arriving together are handled as one
+        while True:
+            traps = [self.queue.get()]
+            while not self.queue.empty(): traps.append(self.queue.get())
+            hosts = {}
+            oids = {}
+            for host,trap_oids in traps:
+                key = host_port(host.hostname)
+                hosts.setdefault(key,host)
+                oids.setdefault(key,[]).extend(trap_oids)
+            for key,host in hosts.items():
+                try:
+                    self.refresh(host,oids[key])
+                except Exception as e:
+                    if self.base_params["verbose"]: print("Trap of %s not evaluated: %s" % (host.hostname,e))
+                    self.repoll(host)
+
+    def refresh(self,host,oids):
+#       fetches the cells of the table rows named by the varbinds of a trap into the snapshot of the host
+#       and evaluates the checks of these tables from it, without a snapshot or a known row the host is polled completely
+        with self.lock: snapshot = self.snapshots.get(host.hostname)
+        names = select_checks(host)
+        cells = []
+        checks = []
+        for oid in oids:
+            for table,table_checks in TRAP_TABLES:
+                if not oid.startswith(table + ".") or snapshot is None: continue
+                index = tuple(int(arc) for arc in oid[len(table)+1:].split(".")[1:])
+                cells += [cell for cell in snapshot.row_cells(table,index) if cell not in cells]
+                checks += [name for name in table_checks if name in names and name not in checks]
+        if not (cells and checks):
+            if self.base_params["verbose"]: print("Trap of %s names no known table row, polling all checks" % host.hostname)
+            return self.repoll(host)
+
+        session = IsamSession(host.hostname,host.community,**self.session_options)
+        session.recorder = snapshot
+        try:
+            session.get_many(cells)
+        finally:
+            session.close()
+        session = IsamSession(host.hostname,None,backend=ReplayBackend(snapshot))
+        params = check_params(host,dict(self.base_params,state_dir=None,slot_dir=None))
+        self.store(host,run_isam_checks(session,[name for name,description in ISAM_CHECKS if name in checks],params))
+        if self.base_params["verbose"]: print("Trap of %s: %i cells fetched, %s evaluated" % (host.hostname,len(cells),", ".join(checks)))
+
+
+class IsamSocketHandler(object):
+#   answers one request "<host> <check>" with "<state> <age>" and the nagios output of the last poll
+#   mixed into socketserver.StreamRequestHandler by run_daemon, so socketserver is only loaded by the daemon
+
+    def handle(self):
+        request = self.rfile.readline().decode("utf-8").split()
+        entry = None
+        if len(request) == 2: entry = self.server.poller.lookup(request[0],request[1])
+        if entry is None:
+            reply = "3 -1\nUNKNOWN - No result from the poller daemon for %s" % " ".join(request)
+        else:
+            reply = "%i %.1f\n%s" % (entry[1],time.time()-entry[0],entry[2])
+        self.wfile.write(reply.encode("utf-8"))
+
+
+class IsamTrapReceiver(object):
+#   receives SNMPv2c traps and informs of the inventory hosts on a UDP socket and queues them for the poller
+#   senders are matched by their address, with a community only traps carrying it are accepted
+#   informs are acknowledged with a response, anything else is dropped
+
+    def __init__(self,poller,listen,community=None):
+        import socket
+        self.poller = poller
+        self.community = community.encode() if community else None
+        self.senders = {}
+        for host in poller.hosts:
+            name = host_port(host.hostname)[0]
+            try:
+                addresses = set(info[4][0] for info in socket.getaddrinfo(name,None,0,socket.SOCK_DGRAM))
+            except OSError:
+                continue
+            for address in addresses: self.senders.setdefault(address,[]).append(host)
+        address,port = listen.rsplit(":",1)
+        address = address.strip("[]")
+        self.socket = socket.socket(socket.AF_INET6 if ":" in address else socket.AF_INET,socket.SOCK_DGRAM)
+        self.socket.bind((address,int(port)))
+
+    def run(self):
+        while True:
+            data,sender = self.socket.recvfrom(65535)
+            hosts = self.senders.get(sender[0])
+            if not hosts: continue
+            try:
+                community,pdu_type,request_id,error_status,error_index,varbinds = ber_decode_message(data)
+            except Exception:
+                continue
+            if pdu_type not in (BER_TRAPV2,BER_INFORM) or (self.community and community != self.community): continue
+            if pdu_type == BER_INFORM: self.socket.sendto(ber_encode_message(community,BER_RESPONSE,request_id,varbinds),sender)
+            oids = [".".join(map(str,oid)) for oid,tag,value in varbinds]
+            for host in hosts: self.poller.queue.put((host,oids))
+
+
+def run_daemon(hosts,base_params,session_options,interval,fleet_options,path,trap_listen=None,trap_community=None):
+#   starts the poller in a background thread and serves its results on a unix socket
+#   with trap_listen traps of the hosts are received on that address and evaluated by the poller
+
+    import signal
+    import threading
+    import socketserver
+    poller = IsamPoller(hosts,base_params,session_options,interval,fleet_options,traps=bool(trap_listen))
+    workers = [poller.run]
+    if trap_listen: workers += [IsamTrapReceiver(poller,trap_listen,trap_community).run,poller.run_traps]
+    for worker in workers:
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    if os.path.exists(path): os.unlink(path)
+    handler = type("IsamStreamHandler",(IsamSocketHandler,socketserver.StreamRequestHandler),{})
+    server = socketserver.ThreadingUnixStreamServer(path,handler)
+    server.daemon_threads = True
+    server.poller = poller
+    signal.signal(signal.SIGTERM,lambda signum,frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+class IsamExporter(object):
+#   Prometheus exporter: polls the checks of a target when it is scraped and renders the results as metrics
+#   a poll is reused by all scrapes of the target within min_interval seconds, concurrent scrapes wait for the same poll
+#   targets are the hosts of the inventory, other hosts only if a default community or SNMPv3 user is given
+#   polls older than min_interval are never served again, they are dropped so the targets of past scrapes do not pile up
+
+    def __init__(self,hosts,defaults,base_params,session_options,min_interval):
+        import threading
+        self.hosts = dict((host.hostname,host) for host in hosts)
+        self.defaults = defaults
+        self.base_params = base_params
+        self.session_options = session_options
+        self.min_interval = min_interval
+        self.polls = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def host(self,target):
+        if target in self.hosts: return self.hosts[target]
+        if not (self.defaults.community or self.defaults.user): return None
+        from optparse import Values
+        return Values(dict(vars(self.defaults),hostname=target))
+
+    def poll(self,host):
+#       returns (timestamp, duration, results) of the last poll of the host, polls again if it is older than min_interval
+        import threading
+        with self.lock:
+            self.expire()
+            lock = self.locks.setdefault(host.hostname,threading.Lock())
+        with lock:
+            entry = self.polls.get(host.hostname)
+            if entry is None or time.time() - entry[0] >= self.min_interval:
+                started = time.perf_counter()
+                results = poll_host(host,self.base_params,self.session_options)
+                entry = (time.time(),time.perf_counter() - started,results)
+                with self.lock: self.polls[host.hostname] = entry
+            return entry
+
+    def expire(self):
+#       drops the polls older than min_interval and the locks of targets without poll which nobody is polling, called with self.lock held
+        now = time.time()
+        for hostname in [hostname for hostname,entry in self.polls.items() if now - entry[0] >= self.min_interval]: del self.polls[hostname]
+        for hostname in [hostname for hostname,lock in self.locks.items() if hostname not in self.polls and not lock.locked()]: del self.locks[hostname]
+
+    def lines(self,entry):
+#       text exposition format, one metric family after the other
+        timestamp,duration,results = entry
+        values = {"isam_check_state":[((("check",result.name),),result.state) for result in results],
+                  "isam_poll_duration_seconds":[((),duration)],
+                  "isam_poll_timestamp_seconds":[((),timestamp)]}
+        for name,description in EXPORTER_METRICS:
+            samples = values.get(name) or [sample for result in results for sample in result.metrics.get(name,())]
+            if not samples: continue
+            yield "# HELP %s %s\n# TYPE %s gauge\n" % (name,description,name)
+            for labels,value in samples:
+                if labels: yield "%s{%s} %s\n" % (name,",".join("%s=\"%s\"" % (key,metric_label(label)) for key,label in labels),repr(float(value)))
+                else: yield "%s %s\n" % (name,repr(float(value)))
+
+
+def metric_label(value):
+#   label value of the exposition format with backslash, double-quote and line feed escaped
+
+    return str(value).replace("\\","\\\\").replace("\"","\\\"").replace("\n","\\n")
+
+
+class IsamMetricsHandler(object):
+#   answers GET /metrics?target=<host>, mixed into http.server.BaseHTTPRequestHandler by run_exporter
+#   the response is written in blocks while it is rendered, without Content-Length the connection ends it
+
+    def do_GET(self):
+        from urllib.parse import urlsplit,parse_qs
+        url = urlsplit(self.path)
+        target = parse_qs(url.query).get("target",[None])[0]
+        if url.path != "/metrics": return self.send_error(404)
+        if not target: return self.send_error(400,"target parameter is missing")
+        host = self.server.exporter.host(target)
+        if host is None: return self.send_error(403,"target is not in the inventory")
+        entry = self.server.exporter.poll(host)
+        self.send_response(200)
+        self.send_header("Content-Type","text/plain; version=0.0.4; charset=utf-8")
+        self.end_headers()
+        block = []
+        size = 0
+        for line in self.server.exporter.lines(entry):
+            block.append(line)
+            size += len(line)
+            if size >= 65536:
+                self.wfile.write("".join(block).encode("utf-8"))
+                block,size = [],0
+        self.wfile.write("".join(block).encode("utf-8"))
+
+    def log_message(self,format,*args):
+        pass
+
+
+def run_exporter(hosts,defaults,base_params,session_options,min_interval,listen):
+#   serves the metrics of the targets over HTTP until the process is stopped
+
+    import signal
+    from http.server import ThreadingHTTPServer,BaseHTTPRequestHandler
+    address,port = listen.rsplit(":",1)
+    handler = type("IsamHTTPHandler",(IsamMetricsHandler,BaseHTTPRequestHandler),{})
+    server = ThreadingHTTPServer((address,int(port)),handler)
+    server.daemon_threads = True
+    server.exporter = IsamExporter(hosts,defaults,base_params,session_options,min_interval)
+    signal.signal(signal.SIGTERM,lambda signum,frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def query_daemon(path,hostname,name,max_age):
+#   asks the poller daemon for the last result of a check
+#   results older than max_age seconds are reported as UNKNOWN
+
+    import socket
+    client = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    client.settimeout(5)
+    client.connect(path)
+    client.sendall(("%s %s\n" % (hostname,name)).encode("utf-8"))
+    reply = b""
+    while True:
+        data = client.recv(65536)
+        if not data: break
+        reply += data
+    client.close()
+
+    header,text = reply.decode("utf-8").split("\n",1)
+    state,age = header.split()
+    result = parse_nagios_output(name,int(state),text)
+    if float(age) > max_age:
+        result.output.insert(0,result.summary)
+        result.state,result.summary = 3,"UNKNOWN - Last result of the poller daemon is %i seconds old (max-age %i)" % (float(age),max_age)
+        result.perfdata = []
+    return result
 
 
 def main():
 
-    slot_mapping = {4352:"acu:1/1",4353:"nt-a",4354:"nt-b",4355:"lt:1/1/1",4356:"lt:1/1/2",4357:"lt:1/1/3",4358:"lt:1/1/4",4359:"lt:1/1/5",4360:"lt:1/1/6",4361:"lt:1/1/7",4362:"lt:1/1/8",4417:"vlt:1/1/63",4418:"vlt:1/1/64"}
-    pon_mapping = {"FGLT-A":"16", "FGLT-B":"16", "FGLT-D":"16", "FWLT-B":"8", "FWLT-C":"16"}
-    msg_invalid_args = "Please check your arguments!"
-    msg_thresholds = "Thresholds are not acceptable!"
     help_message = "\n Collection of Nokia ISAM Monitoring Plugins\n" \
                    "\n Use 'check_isam.py --help' for more information\n"
     usage = "\n %prog --board_availability -s <host> -c <community> -v [verbose]" \
             "\n %prog --board_oper_status  -s <host> -c <community> -v [verbose]" \
             "\n %prog --auto_backup_status -s <host> -c <community> -v [verbose]" \
-            "\n %prog --pon_utilization    -s <host> -c <community> -W <warning (1-99)> -C <critical (2-100)> -v [verbose]" \
+            "\n %prog --pon_utilization    -s <host> -c <community> -W <warning (1-99)> -C <critical (2-100)> [--pon-window <polls>] -v [verbose]" \
             "\n %prog --board_temperature  -s <host> -c <community> -v [verbose]" \
             "\n %prog --nt_redundancy      -s <host> -c <community> -g <groupId (1-5)> -v [verbose]" \
             "\n %prog --power_supply       -s <host> -c <community> -v [verbose]" \
-
+            "\n %prog --ont_optics         -s <host> -c <community> --ont-warning <dBm> --ont-critical <dBm> [--ont-top <n>] -v [verbose]" \
+            "\n %prog --all                -s <host> -c <community> [-W <warning> -C <critical>] [-g <groupId>] -v [verbose]" \
+            "\n %prog --daemon --inventory <file> --socket <path> [--interval <seconds>] [--trap-listen <address:port>]" \
+            "\n %prog --<check> -s <host> --socket <path> [--max-age <seconds>]" \
+            "\n %prog --fleet --inventory <file> [--workers <n>] [--host-concurrency <n>] [--command-file <path> | --spool-dir <path>]" \
+            "\n %prog --<check> --replay <dump|directory> [--replay <dump|directory> ...]" \
+            "\n %prog --<check> -s <host> -c <community> --transport async [--window <n>]" \
+            "\n %prog --<check> -s <host> -c <community> --deadline <seconds>" \
+            "\n %prog --<check> -s <host> -c <community> --parallel <n>" \
+            "\n %prog --<check> -s <host> -c <community> --walk-cache <directory> [--walk-cache-ttl <seconds>] [--walk-cache-size <MiB>]" \
+            "\n %prog --<check> -s <host> -u <user> [-a <MD5|SHA|SHA256>] -A <password> [-x <AES|DES>] [-X <password>]" \
+            "\n %prog --exporter [--inventory <file>] [-c <community>] [--listen <address:port>] [--min-interval <seconds>]" \
+
+#   without arguments there is nothing to parse, the help message is printed before the parser is built
+    if len(sys.argv) < 2:
+        print("%s" % help_message)
+        sys.exit(3)
 
 #   create parser
+    from optparse import OptionParser
     parser = OptionParser(usage=usage,version="%prog 1.5")
 
 #   add options to parser
@@ -526,6 +2811,16 @@ def main():
                       dest="power_supply",
                       help="checks the power supply status of the shelf")
 
+    parser.add_option("--ont_optics",
+                      action="store_true",
+                      dest="ont_optics",
+                      help="checks the rx optical level of all ONTs")
+
+    parser.add_option("--all",
+                      action="store_true",
+                      dest="all",
+                      help="runs all checks in one process (pon_utilization with -W/-C, nt_redundancy with -g, ont_optics with --ont-warning/--ont-critical)")
+
 #   add general parameters
     parser.add_option("-s",
                       dest="hostname",
@@ -535,6 +2830,32 @@ def main():
                       dest="community",
                       help="specify SNMPv2 community")
 
+    parser.add_option("-u",
+                      dest="user",
+                      help="specify SNMPv3 user, SNMPv3 is used over the async transport instead of the community")
+
+    parser.add_option("-a",
+                      dest="auth_protocol",
+                      type="choice",
+                      choices=sorted(USM_AUTH_PROTOCOLS),
+                      default="SHA",
+                      help="SNMPv3 authentication protocol: MD5, SHA or SHA256 (default SHA)")
+
+    parser.add_option("-A",
+                      dest="auth_password",
+                      help="SNMPv3 authentication password, authNoPriv without -X")
+
+    parser.add_option("-x",
+                      dest="priv_protocol",
+                      type="choice",
+                      choices=USM_PRIV_PROTOCOLS,
+                      default="AES",
+                      help="SNMPv3 privacy protocol: AES or DES (default AES)")
+
+    parser.add_option("-X",
+                      dest="priv_password",
+                      help="SNMPv3 privacy password, authPriv")
+
     parser.add_option("-v",
                       action="store_true",
                       dest="verbose",
@@ -553,95 +2874,387 @@ def main():
                       dest="groupId",
                       help="specify a protection-group ID (1-5)")
 
+    parser.add_option("--pon-window",
+                      dest="pon_window",
+                      type="int",
+                      default=0,
+                      help="keep the PON utilization of every poll in the state store and apply -W/-C to the --pon-statistic of this many polls (default 0, current poll only)")
+
+    parser.add_option("--pon-statistic",
+                      dest="pon_statistic",
+                      type="choice",
+                      choices=["p95","mean"],
+                      default="p95",
+                      help="statistic of the PON utilization window: p95 or mean (default p95)")
+
+    parser.add_option("--pon-history",
+                      dest="pon_history",
+                      type="int",
+                      default=2016,
+                      help="polls kept in the PON utilization history per host (default 2016, a week of 5 minute polls)")
+
+    parser.add_option("--ont-warning",
+                      dest="ont_warning",
+                      type="float",
+                      help="ONT rx level in dBm at or below which an ONT is WARNING, e.g. -25")
+
+    parser.add_option("--ont-critical",
+                      dest="ont_critical",
+                      type="float",
+                      help="ONT rx level in dBm at or below which an ONT is CRITICAL, e.g. -28")
+
+    parser.add_option("--ont-pon-critical",
+                      dest="ont_pon_critical",
+                      type="int",
+                      default=4,
+                      help="ONTs at or below the warning level which make their PON CRITICAL (default 4)")
+
+    parser.add_option("--ont-top",
+                      dest="ont_top",
+                      type="int",
+                      default=10,
+                      help="worst ONTs listed in the output of ont_optics, 0 lists none (default 10)")
+
+    parser.add_option("--ont-rx-oid",
+                      dest="ont_rx_oid",
+                      default=OID_ONT_RX,
+                      help="column of the ONT rx optical level (default %s)" % OID_ONT_RX)
+
+    parser.add_option("--ont-tx-oid",
+                      dest="ont_tx_oid",
+                      default=OID_ONT_TX,
+                      help="column of the ONT tx optical level (default %s)" % OID_ONT_TX)
+
+    parser.add_option("--max-repetitions",
+                      dest="max_repetitions",
+                      type="int",
+                      default=25,
+                      help="rows per GETBULK request for table checks (default 25)")
+
+    parser.add_option("--max-varbinds",
+                      dest="max_varbinds",
+                      type="int",
+                      default=32,
+                      help="varbinds per GET request for scalar values (default 32)")
+
+    parser.add_option("--transport",
+                      dest="transport",
+                      type="choice",
+                      choices=["easysnmp","async"],
+                      default="easysnmp",
+                      help="SNMP transport: easysnmp or async with several outstanding requests (default easysnmp)")
+
+    parser.add_option("--window",
+                      dest="window",
+                      type="int",
+                      default=8,
+                      help="outstanding requests per device with --transport async (default 8)")
+
+    parser.add_option("--deadline",
+                      dest="deadline",
+                      type="float",
+                      default=0,
+                      help="time budget of every check in seconds, requests are retried with adaptive timeouts until it is spent (default 0, no budget)")
+
+    parser.add_option("--parallel",
+                      dest="parallel",
+                      type="int",
+                      default=1,
+                      help="easysnmp sessions fetching the columns of a table at the same time, per device (default 1)")
+
+    parser.add_option("--walk-cache",
+                      dest="walk_cache",
+                      help="directory of table walks shared by the checks of all processes, a walk is reused by other processes for --walk-cache-ttl seconds")
+
+    parser.add_option("--walk-cache-ttl",
+                      dest="walk_cache_ttl",
+                      type="float",
+                      default=60,
+                      help="seconds a walk in the walk cache is reused (default 60)")
+
+    parser.add_option("--walk-cache-size",
+                      dest="walk_cache_size",
+                      type="int",
+                      default=64,
+                      help="size of the walk cache in MiB, least recently used walks are removed (default 64)")
+
+    parser.add_option("--exporter",
+                      action="store_true",
+                      dest="exporter",
+                      help="serve the checks as Prometheus metrics on --listen, /metrics?target=<host>")
+
+    parser.add_option("--listen",
+                      dest="listen",
+                      default=":9793",
+                      help="address and port of the exporter (default :9793)")
+
+    parser.add_option("--min-interval",
+                      dest="min_interval",
+                      type="int",
+                      default=60,
+                      help="seconds a poll of a target is reused by the exporter (default 60)")
+
+    parser.add_option("--daemon",
+                      action="store_true",
+                      dest="daemon",
+                      help="poll the hosts of the inventory and serve the results on --socket")
+
+    parser.add_option("--inventory",
+                      dest="inventory",
+                      help="host inventory file, one '<host> <community> [key=value ...]' per line")
+
+    parser.add_option("--interval",
+                      dest="interval",
+                      type="int",
+                      default=300,
+                      help="poll interval of the daemon in seconds (default 300)")
+
+    parser.add_option("--trap-listen",
+                      dest="trap_listen",
+                      help="address and port the daemon receives traps of the inventory hosts on, e.g. :162, a trap re-polls the table rows it names")
+
+    parser.add_option("--trap-community",
+                      dest="trap_community",
+                      help="community of accepted traps, by default every trap of an inventory host is accepted")
+
+    parser.add_option("--socket",
+                      dest="socket",
+                      help="unix socket of the poller daemon, checks are answered from the daemon")
+
+    parser.add_option("--max-age",
+                      dest="max_age",
+                      type="int",
+                      default=900,
+                      help="results from the daemon older than this are UNKNOWN (default 900)")
+
+    parser.add_option("--fleet",
+                      action="store_true",
+                      dest="fleet",
+                      help="poll all hosts of the inventory concurrently and print Check_MK piggyback data")
+
+    parser.add_option("--command-file",
+                      dest="command_file",
+                      help="submit the results of --fleet as passive checks to this Nagios/Icinga command file instead of printing them")
+
+    parser.add_option("--spool-dir",
+                      dest="spool_dir",
+                      help="write the results of --fleet as piggyback data into this Check_MK agent spool directory, one file per host")
+
+    parser.add_option("--spool-max-age",
+                      dest="spool_max_age",
+                      type="int",
+                      default=0,
+                      help="seconds after which the Check_MK agent drops a spool file of --spool-dir, 0 keeps it (default 0)")
+
+    parser.add_option("--workers",
+                      dest="workers",
+                      type="int",
+                      default=32,
+                      help="number of hosts polled at the same time in fleet and daemon mode (default 32)")
+
+    parser.add_option("--host-concurrency",
+                      dest="host_concurrency",
+                      type="int",
+                      default=1,
+                      help="parallel sessions per device for inventory entries of the same host (default 1)")
+
+    parser.add_option("--replay",
+                      action="append",
+                      dest="replay",
+                      help="evaluate the checks from a snmpwalk dump (snmpwalk -On) or all dumps of a directory instead of a device, can be given several times")
+
+    parser.add_option("--timing",
+                      action="store_true",
+                      dest="timing",
+                      help="append runtime, startup, PDUs, rows and the duration per oid to the perfdata")
+
+    parser.add_option("--profile",
+                      action="store_true",
+                      dest="profile",
+                      help="print cProfile and tracemalloc summaries of the run to stderr")
+
+    parser.add_option("--conditional",
+                      action="store_true",
+                      dest="conditional",
+                      help="answer board checks from the state store while the change indicator of the device does not move")
+
+    parser.add_option("--state-dir",
+                      dest="state_dir",
+                      default="/var/tmp/check_isam",
+                      help="directory of the per-host state store of conditional results, slot mappings and PON utilization history (default /var/tmp/check_isam)")
+
+    parser.add_option("--change-oid",
+                      dest="change_oid",
+                      default=OID_ENT_LAST_CHANGE,
+                      help="change counter or timestamp read together with sysUpTime in conditional mode (default entLastChangeTime)")
+
+    parser.add_option("--state-max-age",
+                      dest="state_max_age",
+                      type="int",
+                      default=3600,
+                      help="seconds a stored result is reused at most in conditional mode (default 3600)")
+
+    parser.add_option("--slot-cache",
+                      action="store_true",
+                      dest="slot_cache",
+                      help="keep the discovered slot mapping in the state store instead of discovering it on every run")
+
+    parser.add_option("--slot-max-age",
+                      dest="slot_max_age",
+                      type="int",
+                      default=86400,
+                      help="seconds a slot mapping kept with --slot-cache is reused at most (default 86400)")
+
     try:
 
 #      parse options
         (options,args) = parser.parse_args()
-
-        if options.board_availability:
-            if options.hostname and options.community:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                check_isam_board_availability(hostname,community,slot_mapping,verbose)
-            else:
-                print("%s" % msg_invalid_args)
+        base_params = {"slot_mapping":None,
+                       "ont_pon_critical":options.ont_pon_critical,
+                       "ont_top":options.ont_top,
+                       "ont_rx_oid":options.ont_rx_oid,
+                       "ont_tx_oid":options.ont_tx_oid,
+                       "slot_dir":options.state_dir if options.slot_cache else None,
+                       "slot_max_age":options.slot_max_age,
+                       "timing":options.timing,
+                       "startup":process_startup() if options.timing else None,
+                       "state_dir":options.state_dir if options.conditional else None,
+                       "change_oid":options.change_oid,
+                       "state_max_age":options.state_max_age,
+                       "history_dir":options.state_dir if options.pon_window else None,
+                       "pon_window":options.pon_window,
+                       "pon_statistic":options.pon_statistic,
+                       "pon_history":max(options.pon_history,1),
+                       "verbose":options.verbose}
+        session_options = {"max_repetitions":options.max_repetitions,"max_varbinds":options.max_varbinds,
+                           "transport":options.transport,"window":options.window,"deadline":options.deadline,"parallel":options.parallel,
+                           "walk_cache":WalkCache(options.walk_cache,options.walk_cache_ttl,options.walk_cache_size*1024*1024) if options.walk_cache else None}
+#      SNMPv3 for all hosts, the engines and keys are cached per host in the state directory
+        if options.user:
+            session_options["usm"] = {"user":options.user,"auth_protocol":options.auth_protocol,"auth_password":options.auth_password,
+                                      "priv_protocol":options.priv_protocol,"priv_password":options.priv_password,"cache_dir":options.state_dir}
+
+#      dumps are evaluated without host and community
+        if options.replay:
+            options.hostname = options.hostname or "replay"
+            options.community = options.community or "replay"
+        fleet_options = {"workers":options.workers,"host_concurrency":options.host_concurrency}
+
+#      poller daemon, runs until it is stopped
+        if options.daemon:
+            if not (options.inventory and options.socket):
+                print("%s" % "Please check your arguments!")
                 sys.exit(3)
+            run_daemon(read_inventory(options.inventory,options.user),base_params,session_options,options.interval,fleet_options,options.socket,options.trap_listen,options.trap_community)
+            sys.exit(0)
 
-        if options.board_oper_status:
-            if options.hostname and options.community:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                check_isam_board_operational_status(hostname,community,slot_mapping,verbose)
-            else:
-                print("%s" % msg_invalid_args)
+#      Prometheus exporter, runs until it is stopped
+#      targets outside the inventory use the community or SNMPv3 user and the thresholds of the command line, nt_redundancy group 1 by default
+#      stored results of conditional mode carry no metrics, so the exporter always polls
+        if options.exporter:
+            if not (options.inventory or options.community or options.user):
+                print("%s" % "Please check your arguments!")
                 sys.exit(3)
+            from optparse import Values
+            defaults = Values({"hostname":None,"community":options.community,"user":options.user,"checks":None,"warning":options.warning or 80,"critical":options.critical or 85,"groupId":options.groupId or 1,
+                               "ont_warning":options.ont_warning,"ont_critical":options.ont_critical,"interval":None})
+            hosts = read_inventory(options.inventory,options.user) if options.inventory else []
+            run_exporter(hosts,defaults,dict(base_params,state_dir=None),session_options,options.min_interval,options.listen)
+            sys.exit(0)
 
-        if options.auto_backup_status:
-            if options.hostname and options.community:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                check_isam_auto_backup_status(hostname,community,verbose)
-            else:
-                print("%s" % msg_invalid_args)
+#      fleet mode, all hosts of the inventory are polled once and printed as Check_MK piggyback data
+#      or submitted as passive results (command file, spool directory) as the hosts finish
+        if options.fleet:
+            if not options.inventory:
+                print("%s" % "Please check your arguments!")
                 sys.exit(3)
-
-        if options.pon_utilization:
-            if options.hostname and options.community and options.warning and options.critical:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                warning = int(options.warning)
-                critical = int(options.critical)
-                if 1 <= warning <= 99 and 2 <= critical <= 100 and warning < critical:
-                    check_isam_pon_utilization(hostname,community,warning,critical,pon_mapping,slot_mapping,verbose)
-                else:
-                    print("%s" % msg_thresholds)
-                    sys.exit(3)
-            else:
-                print("%s" % msg_invalid_args)
+            writer = None
+            if options.command_file: writer = NagiosCommandWriter(options.command_file)
+            elif options.spool_dir: writer = CheckmkSpoolWriter(options.spool_dir,options.spool_max_age)
+            states = []
+            try:
+                for host,results in poll_fleet(read_inventory(options.inventory,options.user),base_params,session_options,**fleet_options):
+                    if writer:
+                        writer.add(host.hostname,results)
+                    else:
+                        print("<<<<%s>>>>\n<<<local>>>" % host.hostname)
+                        for result in results: print("%s" % result.local())
+                        print("<<<<>>>>")
+                        sys.stdout.flush()
+                    states += [result.state for result in results]
+            finally:
+                if writer: writer.close()
+            if writer and options.verbose: print("%i results submitted" % writer.results)
+            sys.exit(worst_state(states))
+
+#      select checks: --all runs every check which got its arguments, several check options run that subset
+        if options.all:
+            names = [name for name,description in ISAM_CHECKS if not check_arguments(name,options)]
+            if not names:
+                print("%s" % check_arguments("board_availability",options))
                 sys.exit(3)
+        else:
+            names = [name for name,description in ISAM_CHECKS if getattr(options,name)]
 
-        if options.board_temperature:
-            if options.hostname and options.community:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                check_isam_board_temperature(hostname,community,slot_mapping,verbose)
-            else:
-                print("%s" % msg_invalid_args)
-                sys.exit(3)
+        if not names:
+            print("%s" % help_message)
+            sys.exit(3)
 
-        if options.nt_redundancy:
-            if options.hostname and options.community and options.groupId:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                groupId = int(options.groupId)
-                if 1 <= groupId <= 5:
-                    check_isam_nt_redundancy(hostname,community,groupId,verbose)
-                else:
-                    print("%s" % msg_thresholds)
+#      replay of snmpwalk dumps, with several dumps every capture is printed under its file name
+        if options.replay:
+            for name in names:
+                msg_error = check_arguments(name,options)
+                if msg_error:
+                    print("%s" % msg_error)
                     sys.exit(3)
-            else:
-                print("%s" % msg_invalid_args)
+            params = check_params(options,base_params)
+            params["state_dir"] = None
+            params["slot_dir"] = None
+            params["history_dir"] = None
+            captures = replay_files(options.replay)
+            if not captures:
+                print("UNKNOWN - No dump files found")
                 sys.exit(3)
-
-        if options.power_supply:
-            if options.hostname and options.community:
-                hostname = options.hostname
-                community = options.community
-                verbose = options.verbose
-                check_isam_power_supply(hostname,community,verbose)
-            else:
-                print("%s" % msg_invalid_args)
+            states = []
+            for path in captures:
+                dump = SnmpDump(path)
+                session = IsamSession(os.path.basename(path),None,backend=ReplayBackend(dump),**session_options)
+                results = run_isam_checks(session,names,params)
+                dump.close()
+                if len(captures) == 1: break
+                print("==> %s <==" % path)
+                for result in results: print("%s" % result.local())
+                states += [result.state for result in results]
+            if len(captures) > 1: sys.exit(worst_state(states))
+
+#      client of the poller daemon, answers without touching the device
+        elif options.socket:
+            if not options.hostname:
+                print("%s" % "Please check your arguments!")
                 sys.exit(3)
+            results = [query_daemon(options.socket,options.hostname,name,options.max_age) for name in names]
 
         else:
-            print("%s" % help_message)
-            sys.exit(3)
+            for name in names:
+                msg_error = check_arguments(name,options)
+                if msg_error:
+                    print("%s" % msg_error)
+                    sys.exit(3)
+
+#          one session for all selected checks
+            profiler = start_profile() if options.profile else None
+            session = IsamSession(options.hostname,options.community,**session_options)
+            results = run_isam_checks(session,names,check_params(options,base_params))
+            session.close()
+            if profiler: print_profile(profiler)
+            if options.verbose: print("\n%s" % session.stats())
+
+#      several checks are printed as Check_MK local check lines
+        if len(results) == 1:
+            print("%s" % results[0].nagios())
+        else:
+            for result in results: print("%s" % result.local())
+        sys.exit(worst_state([result.state for result in results]))
 
 #   catch exceptions
     except Exception as e: